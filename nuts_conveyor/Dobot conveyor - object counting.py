@@ -8,11 +8,20 @@ from serial import Serial
 from serial.tools import list_ports
 import threading
 import time
+import os
+import sys
 import cv2  # OpenCV for video capture and display
 
 # Dobot-related imports (assuming these are present in the working environment)
 from dobot_extensions import Dobot
 
+# The camera is shared through the broadcaster of the counting program, so the
+# video feed and counting (and its recorder) use one camera in this one program
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "counting_running_totals"))
+from capture import Capture
+from broadcast import FrameBroadcaster
+import counting_running_totals as counting
+
 # Initialize Dobot
 port = list_ports.comports()[0].device  # Selects the first available port
 port = 'COM18'  # You may need to update this if the port changes
@@ -100,23 +109,40 @@ def control_conveyor_belt():
         time.sleep(0.5)
 
 # Function to show live video feed using OpenCV
+# Counting runs on the same camera, as a second subscriber of its broadcaster
 def show_video_feed():
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+    # The ring holds the frames of counting and the preview together
+    source = Capture(0, counting.capture_width, counting.capture_height, counting.capture_ring_size)
+    if not source.cap.isOpened():
         print("Error: Cannot open webcam")
+        source.release()
         return
-    
+    broadcaster = FrameBroadcaster(source)
+    # Everyone subscribes before the broadcaster starts, so the first frames reach them all
+    counting.belts = [("Belt", broadcaster, counting.belt_roi, counting.zones)]
+    counting.open_belts()
+    preview = broadcaster.subscribe("preview", max_fps=30)
+    broadcaster.start()
+    counting_thread = threading.Thread(target=counting.run_camera, daemon=True)
+    counting_thread.start()
+
     print("Starting video feed...")
     while True:
-        ret, frame = cap.read()
-        if ret:
-            cv2.imshow("Live Video Feed", frame)
-            video_feed_ready.set()  # Set the event when the first frame is successfully shown
+        captured = preview.read()
+        if captured is None:
+            break
+        frame, _, _ = captured
+        cv2.imshow("Live Video Feed", frame)
+        preview.recycle(frame)
+        video_feed_ready.set()  # Set the event when the first frame is successfully shown
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-    cap.release()
+    preview.release()
+    # Closing the camera ends counting too, it prints its counts when it stops
+    broadcaster.close()
+    counting_thread.join()
     cv2.destroyAllWindows()
 
 # Thread to handle the Dobot movements
@@ -1,10 +1,12 @@
 import cv2
 import numpy as np
 import math
-import tensorflow as tf
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "counting_running_totals"))
+from tflite_backend import Interpreter
 import uuid
 import time
-import os
 import csv
 from datetime import datetime
 
@@ -13,7 +15,7 @@ here = os.path.dirname(os.path.realpath(__file__))
 model_path = os.path.join(here, "trained.tflite")
 labels_path = os.path.join(here, "labels.txt")
 
-interpreter = tf.lite.Interpreter(model_path=model_path)
+interpreter = Interpreter(model_path=model_path)
 interpreter.allocate_tensors()
 
 
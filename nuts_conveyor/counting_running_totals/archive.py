@@ -0,0 +1,260 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from belt_roi import resolve_roi
+from capture import open_source
+from fomo import decode_fomo, quantize_threshold
+from fomo_model import FomoModel, load_interpreter
+from preprocess import FramePreprocessor
+from tiling import make_tiles, to_frame_pixels, merge_overlaps
+from tracker import Tracker
+from zones import ZoneCounter
+
+# Archive of model-ready frames for tracking and threshold experiments
+# Decoding the JPEGs or the video and preprocessing them again for every
+# experiment takes longer than the experiment. An archive keeps each model
+# input as the gray image the model sees (its int8 input is the lookup table
+# of that), and optionally the raw model output too, in .npy files that
+# np.load(mmap_mode="r") maps straight from disk:
+#   frames.npy         (N, input_h, input_w) uint8 gray model inputs
+#   outputs.npy        (N, grid_h, grid_w, channels) raw model outputs, optional
+#   rois.npy           (N, 4) int32 part of the camera frame each input is (x, y, w, h)
+#   timestamps.npy     (N,) float64 capture time of the frame
+#   frame_indexes.npy  (N,) int64 number of the frame, the tiles of a frame share it
+#   archive.json       model, sizes, classes and output quantization
+# With the outputs a replay only decodes and tracks, so trying another
+# min_confidence or tracker setting on a whole shift takes seconds. Without
+# them the frames still skip decoding and preprocessing.
+#
+# Build an archive from a camera, a video or a directory of images, then replay it:
+#   python archive.py build ../M6.class archives/m6 [model dir] [--outputs]
+#   python archive.py replay archives/m6 [min_confidence]
+
+here = os.path.dirname(os.path.realpath(__file__))
+default_model_dir = os.path.join(here, "..", "Inference - impulse 2- 180 X 180")
+
+# The .npy header is written with the final length up front and rewritten as
+# frames are added, so an archive cut short by a crash still opens
+header_size = 128
+sync_every = 256
+
+
+def _npy_header(dtype, shape):
+    text = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": shape})
+    text = text.ljust(header_size - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(text).to_bytes(2, "little") + text.encode("latin1")
+
+
+class _NpyAppender:
+    # One .npy file written a row at a time
+    def __init__(self, path, dtype, row_shape):
+        self.file = open(path, "wb")
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.count = 0
+        self.file.write(_npy_header(self.dtype, (0,) + self.row_shape))
+
+    def append(self, row):
+        self.file.write(np.ascontiguousarray(row, dtype=self.dtype).data)
+        self.count += 1
+
+    def sync(self):
+        end = self.file.tell()
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, (self.count,) + self.row_shape))
+        self.file.seek(end)
+        self.file.flush()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+class ArchiveWriter:
+    def __init__(self, directory, info, outputs=False):
+        # info is what goes into archive.json, it needs input_w, input_h and for outputs
+        # grid_w, grid_h, channels and output_dtype
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.info = dict(info)
+        self.frames = _NpyAppender(os.path.join(directory, "frames.npy"), np.uint8, (info["input_h"], info["input_w"]))
+        self.rois = _NpyAppender(os.path.join(directory, "rois.npy"), np.int32, (4,))
+        self.timestamps = _NpyAppender(os.path.join(directory, "timestamps.npy"), np.float64, ())
+        self.frame_indexes = _NpyAppender(os.path.join(directory, "frame_indexes.npy"), np.int64, ())
+        self.outputs = None
+        if outputs:
+            self.outputs = _NpyAppender(os.path.join(directory, "outputs.npy"), info["output_dtype"],
+                                        (info["grid_h"], info["grid_w"], info["channels"]))
+        self.files = [self.frames, self.rois, self.timestamps, self.frame_indexes] + ([self.outputs] if outputs else [])
+        with open(os.path.join(directory, "archive.json"), "w") as f:
+            json.dump(self.info, f, indent=2)
+
+    def add(self, gray, roi, timestamp, frame_index, output=None):
+        # gray is the model input as a gray image, output the raw model output without the batch dimension
+        self.frames.append(gray)
+        self.rois.append(roi)
+        self.timestamps.append(timestamp)
+        self.frame_indexes.append(frame_index)
+        if self.outputs is not None:
+            self.outputs.append(output)
+        if self.frames.count % sync_every == 0:
+            for appender in self.files:
+                appender.sync()
+
+    def close(self):
+        for appender in self.files:
+            appender.close()
+
+
+class Archive:
+    # An archive opened for reading, the arrays are memory maps of the files
+    def __init__(self, directory):
+        with open(os.path.join(directory, "archive.json")) as f:
+            self.info = json.load(f)
+        self.frames = np.load(os.path.join(directory, "frames.npy"), mmap_mode="r")
+        self.rois = np.load(os.path.join(directory, "rois.npy"), mmap_mode="r")
+        self.timestamps = np.load(os.path.join(directory, "timestamps.npy"), mmap_mode="r")
+        self.frame_indexes = np.load(os.path.join(directory, "frame_indexes.npy"), mmap_mode="r")
+        outputs = os.path.join(directory, "outputs.npy")
+        self.outputs = np.load(outputs, mmap_mode="r") if os.path.exists(outputs) else None
+        # The entries of each frame are next to each other, frame_starts[i]:frame_starts[i + 1]
+        # are the tiles of frame i. A crash can leave the files a few rows apart
+        count = min(len(self.frames), len(self.rois), len(self.timestamps), len(self.frame_indexes),
+                    len(self.outputs) if self.outputs is not None else len(self.frames))
+        indexes = np.asarray(self.frame_indexes[:count])
+        starts = np.flatnonzero(np.diff(indexes)) + 1
+        self.frame_starts = np.concatenate(([0], starts, [count])) if count else np.zeros(1, dtype=np.intp)
+        self.count = count
+
+    def frame_count(self):
+        return len(self.frame_starts) - 1
+
+
+def build_archive(source, directory, model_dir=default_model_dir, outputs=False, belt_roi=None,
+                  tiled=False, tile_overlap=40, gray=True):
+    # Every frame of source (anything open_source takes) preprocessed for the model in model_dir
+    # belt_roi, tiled and tile_overlap work like in counting_running_totals.py
+    # outputs=True runs the model on each input and keeps its raw output
+    interpreter = load_interpreter(os.path.join(model_dir, "trained.tflite"))
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = interpreter.get_output_details()[0]
+    # The preprocessor of the inference pool, the archive gets its gray image
+    preprocess = FramePreprocessor(interpreter, input_detail)
+    _, input_h, input_w, _ = (int(n) for n in input_detail['shape'])
+    _, grid_h, grid_w, channels = (int(n) for n in output_detail['shape'])
+    scale, zero_point = output_detail['quantization']
+    with open(os.path.join(model_dir, "labels.txt")) as f:
+        labels = [line.strip().lower() for line in f if line.strip()]
+    info = {"model": os.path.basename(os.path.normpath(model_dir)), "classes": labels[1:],
+            "input_w": input_w, "input_h": input_h, "grid_w": grid_w, "grid_h": grid_h, "channels": channels,
+            "output_dtype": np.dtype(output_detail['dtype']).name,
+            "output_scale": float(scale) or 1.0, "output_zero_point": int(zero_point) if scale else 0}
+
+    frames = open_source(source, policy="block", gray=gray)
+    writer = None
+    tiles = None
+    started = time.monotonic()
+    while True:
+        captured = frames.read()
+        if captured is None:
+            break
+        frame, timestamp, frame_index = captured
+        if tiles is None:
+            roi = resolve_roi(belt_roi, frame)
+            tiles = make_tiles(roi, input_w, input_h, tile_overlap) if tiled else [roi]
+            info["frame_w"], info["frame_h"] = frame.shape[1], frame.shape[0]
+            writer = ArchiveWriter(directory, info, outputs)
+        for tile in tiles:
+            preprocess(frame, 0, tile)
+            output = None
+            if outputs:
+                interpreter.invoke()
+                output = interpreter.get_tensor(output_detail['index'])[0]
+            writer.add(preprocess.gray, tile, timestamp, frame_index, output)
+        frames.recycle(frame)
+    frames.release()
+    if writer is None:
+        raise IOError(f"No frames in {source}")
+    writer.close()
+    return writer.frames.count, time.monotonic() - started
+
+
+def replay(directory, min_confidence=0.1, min_visible_area=1, max_tracking_distance=50,
+           max_disappeared_frames=10, zones=None, conveyor_direction=1, tile_merge_distance=20,
+           model_dir=None, workers=2):
+    # Counts an archive like counting_running_totals.py would, returns the ZoneCounter
+    # The raw outputs are used when the archive has them, otherwise the frames run through
+    # the model in model_dir (the archive's model by default)
+    archive = Archive(directory)
+    info = archive.info
+    if zones is None:
+        zones = [("Counting Line", [(0, 400), (info["frame_w"], 400)])]
+    classes = info["classes"]
+    tracker = Tracker(max_tracking_distance, max_disappeared_frames, class_count=len(classes))
+    zone_counter = ZoneCounter(zones, len(classes), conveyor_direction)
+
+    model = None
+    if archive.outputs is None:
+        model = FomoModel(model_dir or os.path.join(here, "..", info["model"]), min_confidence,
+                          min_visible_area, workers)
+        grid_w, grid_h = model.grid_w, model.grid_h
+        if model.classes != classes:
+            raise ValueError(f"The model has classes {model.classes}, the archive {classes}")
+    else:
+        grid_w, grid_h = info["grid_w"], info["grid_h"]
+        threshold = quantize_threshold(min_confidence, info["output_scale"], info["output_zero_point"],
+                                       np.dtype(info["output_dtype"]))
+
+    def detections(entry):
+        return decode_fomo(archive.outputs[entry], threshold, min_visible_area,
+                           info["output_scale"], info["output_zero_point"])
+
+    started = time.monotonic()
+    next_submit = 0
+    for number in range(archive.frame_count()):
+        first, end = archive.frame_starts[number], archive.frame_starts[number + 1]
+        if model is None:
+            results = [detections(entry) for entry in range(first, end)]
+        else:
+            # Keep the pool busy, the frames are model-ready so its preprocessing is only a copy
+            while next_submit < archive.count and next_submit < end + 2 * workers:
+                model.pool.submit(archive.frames[next_submit], True, None, next_submit)
+                next_submit += 1
+            results = [model.pool.get()[2] for _ in range(first, end)]
+        rois = [tuple(int(n) for n in archive.rois[entry]) for entry in range(first, end)]
+        frame_classes, centers, confidences, areas, tile_numbers = to_frame_pixels(results, rois, grid_w, grid_h)
+        if len(rois) > 1:
+            frame_classes, centers, confidences, areas = merge_overlaps(frame_classes, centers, confidences, areas,
+                                                                        tile_numbers, rois, tile_merge_distance)
+        # Tracks age by the frames replayed, like by the frames counted live
+        slots = tracker.update(frame_classes, centers, archive.timestamps[first], number + 1, confidences)
+        zone_counter.update(tracker.store, slots)
+        tracker.expire(number + 1)
+    if model is not None:
+        while model.pool.in_flight():
+            model.pool.get()
+        model.close()
+    return zone_counter, archive.frame_count(), time.monotonic() - started
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        arguments = [a for a in sys.argv[2:] if a != "--outputs"]
+        source = int(arguments[0]) if arguments[0].isdigit() else arguments[0]
+        count, seconds = build_archive(source, arguments[1], *arguments[2:3], outputs="--outputs" in sys.argv)
+        print(f"Archived {count} model inputs in {seconds:.1f} s")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        min_confidence = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+        zone_counter, count, seconds = replay(sys.argv[2], min_confidence)
+        print(f"Replayed {count} frames in {seconds:.2f} s ({count / max(seconds, 1e-9):.0f} fps)")
+        classes = Archive(sys.argv[2]).info["classes"]
+        for name, counts, reverse in zip(zone_counter.names, zone_counter.counts, zone_counter.reverse_counts):
+            print(f"{name}: " + ", ".join(f"{nut.upper()} {count}" for nut, count in zip(classes, counts)) +
+                  "; crossed back " + ", ".join(f"{nut.upper()} {count}" for nut, count in zip(classes, reverse)))
+    else:
+        print("python archive.py build <camera, video or image directory> <archive directory> [model directory] [--outputs]")
+        print("python archive.py replay <archive directory> [min_confidence]")
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+# Startup time and memory of each installed TFLite backend
+# Every backend is measured in a fresh Python process, which is what a
+# restarted counter pays: importing the runtime, loading the model and the
+# first invoke. Run with the model to test as the argument, by default the
+# impulse 2 model.
+#   python backend_benchmark.py "../Inference - impulse 1 - 160 x 160/trained.tflite"
+
+here = os.path.dirname(os.path.realpath(__file__))
+default_model = os.path.join(here, "..", "Inference - impulse 2- 180 X 180", "trained.tflite")
+
+child_code = """
+import json, sys, time
+start = time.perf_counter()
+from tflite_backend import Interpreter, backend
+imported = time.perf_counter()
+interpreter = Interpreter(model_path=sys.argv[1], num_threads=1)
+interpreter.allocate_tensors()
+loaded = time.perf_counter()
+interpreter.invoke()
+invoked = time.perf_counter()
+try:
+    import psutil
+    rss_mb = psutil.Process().memory_info().rss / 2**20
+except ImportError:
+    try:
+        import resource
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        rss_mb = float("nan")
+print(json.dumps({"backend": backend, "import": imported - start, "load": loaded - imported,
+                  "first_invoke": invoked - loaded, "rss_mb": rss_mb}))
+"""
+
+
+def measure(backend, model_path):
+    env = dict(os.environ, TFLITE_BACKEND=backend)
+    run = subprocess.run([sys.executable, "-c", child_code, model_path], cwd=here, env=env,
+                         capture_output=True, text=True)
+    if run.returncode != 0:
+        return None
+    return json.loads(run.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    from tflite_backend import backends
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else default_model
+    print(f"{'backend':<16}{'import s':>10}{'load s':>10}{'invoke s':>10}{'total s':>10}{'RSS MB':>10}")
+    for backend in backends:
+        result = measure(backend, model_path)
+        if result is None:
+            print(f"{backend:<16}{'not installed':>30}")
+            continue
+        total = result["import"] + result["load"] + result["first_invoke"]
+        print(f"{backend:<16}{result['import']:>10.3f}{result['load']:>10.3f}"
+              f"{result['first_invoke']:>10.3f}{total:>10.3f}{result['rss_mb']:>10.1f}")
@@ -0,0 +1,81 @@
+import time
+
+from broadcast import FrameBroadcaster
+from zones import ZoneCounter
+
+# One conveyor belt of the counting program
+# Everything that belongs to a single belt: its frame source and the
+# subscription counting reads from, the belt ROI and tiles, motion gate,
+# tracker, counting zones and metrics. All belts share one model and its
+# inference pool, so N belts need one TensorFlow import and one set of
+# interpreters instead of N copies of the program.
+
+
+class Belt:
+    def __init__(self, name, source, zones, class_count, tracker, gate=None, belt_roi=None,
+                 conveyor_direction=1, queue_size=4, broadcaster=None):
+        # source is a frame source from capture.py, gate a MotionGate or None to infer every frame
+        # belt_roi is None, "auto" or (x, y, w, h) like in resolve_roi
+        # broadcaster is the FrameBroadcaster of source when another part of the program
+        # already shares it (e.g. with a preview window), that part starts and closes it
+        self.name = name
+        self.source = source
+        self.owns_broadcaster = broadcaster is None
+        self.broadcaster = FrameBroadcaster(source) if broadcaster is None else broadcaster
+        self.cap = self.broadcaster.subscribe("counting", queue_size=queue_size, policy=source.policy)
+        self.tracker = tracker
+        # Frames given to the tracker, its tracks age by these and not by the capture's frame index
+        self.tracked_frames = 0
+        self.gate = gate
+        self.belt_roi = belt_roi
+        self.zone_counter = ZoneCounter(zones, class_count, conveyor_direction)
+        self.roi = None
+        self.tiles = None
+        self.display = None
+        self.visible_now = {}
+        # A VideoRecorder or None
+        self.recorder = None
+        # Frames in the inference pool
+        self.in_flight = 0
+        # Metrics
+        self.counted_frames = 0
+        self.total_latency = 0.0
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+        if self.owns_broadcaster:
+            self.broadcaster.start()
+
+    def finished(self):
+        # The source has ended and every frame of it has been counted
+        return self.cap.finished() and not self.in_flight
+
+    def counted(self, submitted):
+        # A frame was counted, submitted is the time.monotonic() it went to the pool
+        self.in_flight -= 1
+        self.counted_frames += 1
+        self.total_latency += time.monotonic() - submitted
+
+    def fps(self):
+        return self.counted_frames / (time.monotonic() - self.started) if self.started else 0.0
+
+    def metrics(self):
+        latency = self.total_latency / self.counted_frames * 1000 if self.counted_frames else 0.0
+        text = (f"{self.name}: counted {self.counted_frames} frames at {self.fps():.1f} fps, "
+                f"{latency:.0f} ms from pool to count, dropped {self.source.dropped} in capture and "
+                f"{self.cap.dropped} in counting of {self.source.frame_index} frames")
+        if self.source.failed:
+            text += f", {self.source.failed} of the dropped frames couldn't be decoded"
+        if self.gate is not None:
+            text += f", motion gate skipped {self.gate.skip_ratio():.0%}"
+        if self.recorder is not None:
+            text += f", recorded {self.recorder.recorded} frames and dropped {self.recorder.dropped}"
+        return text
+
+    def close(self):
+        self.cap.release()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.owns_broadcaster:
+            self.broadcaster.close()
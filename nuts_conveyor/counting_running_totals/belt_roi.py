@@ -0,0 +1,47 @@
+import cv2
+
+# The part of the camera image that shows the belt
+# Same idea as img.scale(x_scale=1.2, roi=(50, 55, 540, 240)) in the OpenMV
+# scripts: only the belt is sent to the model, so no model pixels are spent on
+# the background. An ROI is (x, y, w, h) in full frame pixels.
+
+
+def detect_belt_roi(frame, dark_level=60, min_fraction=0.1):
+    # The belt is the biggest dark area in the image
+    # Returns None when nothing big and dark enough is found
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    _, mask = cv2.threshold(gray, dark_level, 255, cv2.THRESH_BINARY_INV)
+    # Closing fills in the bright nuts lying on the belt
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 25))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    biggest = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(biggest) < min_fraction * gray.shape[0] * gray.shape[1]:
+        return None
+    return cv2.boundingRect(biggest)
+
+
+def resolve_roi(belt_roi, frame):
+    # belt_roi is None (whole frame), "auto" or (x, y, w, h)
+    # Returns (x, y, w, h) clipped to the frame
+    frame_h, frame_w = frame.shape[:2]
+    if belt_roi is None:
+        return (0, 0, frame_w, frame_h)
+    if belt_roi == "auto":
+        detected = detect_belt_roi(frame)
+        if detected is None:
+            print("Belt not found, using the whole frame")
+            return (0, 0, frame_w, frame_h)
+        print(f"Belt found at {detected}")
+        return detected
+    x, y, w, h = belt_roi
+    x, y = max(0, min(x, frame_w - 1)), max(0, min(y, frame_h - 1))
+    return (x, y, min(w, frame_w - x), min(h, frame_h - y))
+
+
+def crop(frame, roi):
+    # A view into the frame, nothing is copied
+    x, y, w, h = roi
+    return frame[y:y + h, x:x + w]
@@ -0,0 +1,181 @@
+import collections
+import threading
+
+# One camera (or other frame source) shared by several consumers
+# The broadcaster reads each frame once and hands the same buffer to every
+# subscriber: counting, a preview window, a recorder... The frames are
+# read-only views, nobody can draw on a frame another subscriber is still
+# using. Each frame has a count of the subscribers holding it and goes back
+# to the source's ring when the last one recycles it.
+#
+# Every subscriber has its own queue, rate limit and drop policy:
+#   "latest"       only the newest frame waits, older ones are dropped
+#   "drop_oldest"  up to queue_size frames wait, the oldest is dropped when full
+#   "block"        up to queue_size frames wait, then the broadcaster waits for
+#                  this subscriber (and holds up the others), for offline replay
+# Subscriptions look like a frame source: read(), recycle(), release().
+
+subscription_policies = ("latest", "drop_oldest", "block")
+
+
+class RateLimit:
+    # At most max_fps frames a second by their timestamps, None lets every frame through
+    # Used by the subscriptions and the video recorder
+    def __init__(self, max_fps):
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.last_timestamp = None
+
+    def allows(self, timestamp):
+        # True when the frame at timestamp is let through, it's then the last one
+        # A millisecond of slack, 3 frames of 1/30 s must count as 1/10 s
+        if self.last_timestamp is not None and timestamp - self.last_timestamp < self.min_interval - 0.001:
+            return False
+        self.last_timestamp = timestamp
+        return True
+
+
+class Subscription:
+    def __init__(self, broadcaster, name, max_fps, queue_size, policy):
+        if policy not in subscription_policies:
+            raise ValueError(f"Unknown subscription policy {policy!r}, use one of {subscription_policies}")
+        self.broadcaster = broadcaster
+        self.name = name
+        # Frames skipped by the rate limit aren't counted as dropped
+        self.rate_limit = RateLimit(max_fps)
+        self.queue_size = queue_size
+        self.policy = policy
+        self.queue = collections.deque()  # (frame, timestamp, frame_index) oldest first
+        self.changed = threading.Condition()
+        self.ended = False
+        self.closed = False
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def frame_index(self):
+        # Frames the source has produced so far
+        return self.broadcaster.source.frame_index
+
+    def read(self, block=True):
+        # (frame, timestamp, frame_index), None when the source has no more frames
+        # Waits for a frame if none is ready, with block=False returns None instead
+        with self.changed:
+            while block and not self.queue and not self.ended and not self.closed:
+                self.changed.wait()
+            if not self.queue:
+                return None
+            captured = self.queue.popleft()
+            self.delivered += 1
+            self.changed.notify_all()
+        return captured
+
+    def recycle(self, frame):
+        # Done with a frame from read()
+        self.broadcaster._release(frame)
+
+    def depth(self):
+        # Frames waiting to be read
+        return len(self.queue)
+
+    def finished(self):
+        # The source has ended and every frame has been read
+        return (self.ended or self.closed) and not self.queue
+
+    def release(self):
+        # Unsubscribes, the frames still waiting are given back
+        self.broadcaster._unsubscribe(self)
+        with self.changed:
+            self.closed = True
+            waiting = list(self.queue)
+            self.queue.clear()
+            self.changed.notify_all()
+        for frame, _, _ in waiting:
+            self.broadcaster._release(frame)
+
+    def _offer(self, frame, timestamp, frame_index):
+        dropped = []
+        with self.changed:
+            if self.policy == "block":
+                while len(self.queue) >= self.queue_size and not self.closed:
+                    self.changed.wait()
+            if self.closed:
+                dropped.append((frame, timestamp, frame_index))
+            else:
+                if self.policy == "latest":
+                    dropped.extend(self.queue)
+                    self.queue.clear()
+                elif len(self.queue) >= self.queue_size:
+                    dropped.append(self.queue.popleft())
+                self.queue.append((frame, timestamp, frame_index))
+                self.changed.notify_all()
+        self.dropped += len(dropped)
+        for dropped_frame, _, _ in dropped:
+            self.broadcaster._release(dropped_frame)
+
+    def _end(self):
+        with self.changed:
+            self.ended = True
+            self.changed.notify_all()
+
+
+class FrameBroadcaster:
+    def __init__(self, source):
+        # source is a frame source from capture.py, its ring has to hold the
+        # frames of all subscribers at once
+        self.source = source
+        self.subscriptions = []
+        self.references = {}  # id(shared frame) -> [shared frame, source frame, subscribers holding it]
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def subscribe(self, name, max_fps=None, queue_size=2, policy="latest"):
+        # max_fps limits the frames this subscriber gets, by their timestamps
+        subscription = Subscription(self, name, max_fps, queue_size, policy)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def start(self):
+        # After subscribing, so the first frames reach everyone
+        self.thread.start()
+
+    def close(self):
+        self.source.release()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def _release(self, shared):
+        with self.lock:
+            reference = self.references[id(shared)]
+            reference[2] -= 1
+            if reference[2] > 0:
+                return
+            del self.references[id(shared)]
+        self.source.recycle(reference[1])
+
+    def _run(self):
+        while True:
+            captured = self.source.read()
+            if captured is None:
+                break
+            frame, timestamp, frame_index = captured
+            shared = frame.view()
+            shared.flags.writeable = False
+            with self.lock:
+                receivers = [subscription for subscription in self.subscriptions if subscription.rate_limit.allows(timestamp)]
+                if not receivers:
+                    self.source.recycle(frame)
+                    continue
+                self.references[id(shared)] = [shared, frame, len(receivers)]
+            for subscription in receivers:
+                subscription._offer(shared, timestamp, frame_index)
+
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription._end()
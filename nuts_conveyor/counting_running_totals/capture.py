@@ -0,0 +1,333 @@
+import collections
+import concurrent.futures
+import glob
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Frame sources: the start of the pipeline
+# Every frame gets a timestamp and its number, counting from 0. Tracking uses
+# those instead of the time the frame happens to be processed, so a slow PC or
+# a replay faster than real time gives the same tracks. The camera stamps a
+# frame with the time it was grabbed (time.monotonic, so it never jumps like
+# the wall clock), the offline sources (video file, directory of images,
+# frames in memory) with frame number / fps.
+#
+# A source is read on its own thread into a ring of frame buffers allocated
+# once, so slow inference never leaves frames waiting in the driver. When the
+# counter falls behind frames are dropped instead of queued:
+#   "latest"       read() returns the newest frame, older unread ones are dropped
+#   "drop_oldest"  read() returns the frames in order, when the ring is full
+#                  the oldest unread frame makes room for the new one
+#   "block"        read() returns every frame in order, the source waits for
+#                  a free buffer (offline sources run as fast as possible)
+# A frame from read() belongs to the caller until it's given back with
+# recycle(), so it can wait in the inference pool and be drawn on. The frame
+# numbers count the dropped frames too. A frame that can't be retrieved or
+# decoded (e.g. a corrupt MJPEG frame) is dropped as well, only a source that
+# can't grab any more frames ends.
+#
+# With gray=True the frames come as gray images (height, width), which is
+# what the model takes, so preprocessing and the motion gate skip the colour
+# conversion. The camera is asked for MJPEG, which needs far less USB
+# bandwidth than raw frames, and for raw frames from the driver: a JPEG is
+# then decoded straight to gray (only its luma), a YUYV frame gives its Y
+# plane without any conversion. Drivers that only give BGR are converted.
+
+policies = ("latest", "drop_oldest", "block")
+image_extensions = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource:
+    def __init__(self, ring_size=8, policy="latest"):
+        # ring_size has to be more than the frames the caller holds at once
+        if policy not in policies:
+            raise ValueError(f"Unknown capture policy {policy!r}, use one of {policies}")
+        self.policy = policy
+        self.ring_size = ring_size
+        self.buffers = []  # allocated with the size of the first frame
+        self.free = collections.deque(range(ring_size))
+        self.queued = collections.deque()  # (slot, timestamp, frame_index) oldest first
+        self.changed = threading.Condition()
+        self.running = True
+        self.ended = False
+        self.frame_index = 0
+        self.dropped = 0
+        # Of the dropped frames, the ones that couldn't be retrieved or decoded
+        self.failed = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def read(self):
+        # (frame, timestamp, frame_index), None when the source has no more frames
+        # Waits for a frame if none is ready
+        with self.changed:
+            while not self.queued and not self.ended:
+                self.changed.wait()
+            if not self.queued:
+                return None
+            if self.policy == "latest":
+                while len(self.queued) > 1:
+                    self.free.append(self.queued.popleft()[0])
+                    self.dropped += 1
+            slot, timestamp, frame_index = self.queued.popleft()
+            self.changed.notify_all()
+        return self.buffers[slot], timestamp, frame_index
+
+    def recycle(self, frame):
+        # Gives a frame from read() back to the ring, giving it back twice does nothing
+        for slot, buffer in enumerate(self.buffers):
+            if buffer is frame:
+                with self.changed:
+                    if slot not in self.free:
+                        self.free.append(slot)
+                        self.changed.notify_all()
+                return
+
+    def depth(self):
+        # Frames captured but not read yet
+        return len(self.queued)
+
+    def release(self):
+        with self.changed:
+            self.running = False
+            self.changed.notify_all()
+        self.thread.join()
+
+    def _grab(self):
+        # Moves to the next frame and returns its timestamp, None at the end
+        raise NotImplementedError
+
+    def _retrieve(self, buffer):
+        # The frame grab() moved to, written into buffer when it can be, None if it
+        # fails (the frame is dropped). buffer is None for the first frame
+        raise NotImplementedError
+
+    def _run(self):
+        while self.running:
+            timestamp = self._grab()
+            if timestamp is None:
+                break
+            frame_index = self.frame_index
+            self.frame_index += 1
+
+            with self.changed:
+                if self.policy == "block":
+                    while not self.free and self.running:
+                        self.changed.wait()
+                if not self.running:
+                    break
+                if self.free:
+                    slot = self.free.popleft()
+                elif self.queued:
+                    slot = self.queued.popleft()[0]
+                    self.dropped += 1
+                else:
+                    # The caller holds every buffer, there's nowhere to put this frame
+                    self.dropped += 1
+                    continue
+
+            frame = self._retrieve(self.buffers[slot] if self.buffers else None)
+            if frame is not None:
+                if not self.buffers:
+                    self.buffers = [np.empty_like(frame) for _ in range(self.ring_size)]
+                buffer = self.buffers[slot]
+                if frame is buffer:
+                    pass
+                elif frame.shape == buffer.shape:
+                    np.copyto(buffer, frame)
+                else:
+                    # e.g. an image directory with pictures of different sizes
+                    cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer)
+
+            with self.changed:
+                if frame is None:
+                    self.free.append(slot)
+                    self.dropped += 1
+                    self.failed += 1
+                    if self.failed == 1:
+                        print(f"Frame {frame_index} couldn't be decoded, dropped (and any more in the metrics)")
+                    continue
+                self.queued.append((slot, timestamp, frame_index))
+                self.changed.notify_all()
+
+        with self.changed:
+            self.ended = True
+            self.changed.notify_all()
+
+
+def _to_gray(raw, buffer):
+    # The frame as gray whatever the driver gave, None when it can't be decoded
+    # A conversion writes straight into buffer, the rest is copied into it by FrameSource
+    if raw is None or not raw.size:
+        return None
+    if raw.ndim == 3 and raw.shape[2] == 3:
+        return cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY, dst=buffer)
+    if raw.ndim == 3 and raw.shape[2] == 4:
+        return cv2.cvtColor(raw, cv2.COLOR_BGRA2GRAY, dst=buffer)
+    if raw.ndim == 3 and raw.shape[2] == 2:
+        # YUYV, every other byte is the Y plane
+        return raw[:, :, 0]
+    if raw.ndim == 2 and raw.shape[0] > 1:
+        # Gray already (GREY / Y800)
+        return raw
+    # A compressed MJPEG frame as one row of bytes
+    return cv2.imdecode(raw.reshape(-1), cv2.IMREAD_GRAYSCALE)
+
+
+class Capture(FrameSource):
+    # A camera
+    def __init__(self, source=0, width=640, height=480, ring_size=8, policy="latest", gray=False, fourcc="MJPG"):
+        # source is a camera index (usually 0 for built-in, 1 for external)
+        # fourcc is the camera format asked for, set before the size as some
+        # drivers only offer the bigger sizes in MJPEG. None leaves the default
+        super().__init__(ring_size, policy)
+        self.cap = cv2.VideoCapture(source)
+        self.gray = gray
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if gray:
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        self.thread.start()
+
+    def mode(self):
+        # (fourcc, width, height) the camera actually runs at
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        return ("".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)),
+                int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+    def _grab(self):
+        # The time is taken at grab(), retrieve() only decodes the frame
+        if not self.cap.grab():
+            return None
+        return time.monotonic()
+
+    def _retrieve(self, buffer):
+        if self.gray:
+            ret, raw = self.cap.retrieve()
+            return _to_gray(raw, buffer) if ret else None
+        ret, frame = self.cap.retrieve(buffer)
+        return frame if ret else None
+
+
+class _OfflineSource(FrameSource):
+    # Frames with made up timestamps, frame number / fps
+    # realtime=True plays them at fps like a camera would, otherwise as fast
+    # as the counter takes them (and every frame is counted, no drops)
+    def __init__(self, fps, realtime, ring_size, policy, gray):
+        super().__init__(ring_size, policy if realtime else "block")
+        self.fps = fps
+        self.gray = gray
+        self.realtime = realtime
+        self.started = None
+
+    def _grab(self):
+        if not self._next():
+            return None
+        timestamp = self.frame_index / self.fps
+        if self.realtime:
+            if self.started is None:
+                self.started = time.monotonic()
+            time.sleep(max(0.0, self.started + timestamp - time.monotonic()))
+        return timestamp
+
+    def _next(self):
+        # Moves to the next frame, False at the end
+        raise NotImplementedError
+
+
+class VideoFileSource(_OfflineSource):
+    # A video file, decoded on the source's thread while the frames before are counted
+    # fps=None takes it from the file
+    def __init__(self, path, fps=None, realtime=False, ring_size=8, policy="latest", gray=False):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Can't open video {path}")
+        super().__init__(fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0, realtime, ring_size, policy, gray)
+        self.thread.start()
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+    def _next(self):
+        return self.cap.grab()
+
+    def _retrieve(self, buffer):
+        if self.gray:
+            ret, frame = self.cap.retrieve()
+            return _to_gray(frame, buffer) if ret else None
+        ret, frame = self.cap.retrieve(buffer)
+        return frame if ret else None
+
+
+class ImageDirectorySource(_OfflineSource):
+    # The images in a directory in name order, e.g. the M6.class ... M12.class folders
+    # decode_threads images are decoded at once (imread runs without the GIL),
+    # up to ring_size images ahead of the counter. Gray JPEGs decode only their luma
+    def __init__(self, path, fps=30.0, realtime=False, ring_size=8, policy="latest", gray=False, decode_threads=4):
+        self.paths = sorted(p for p in glob.glob(os.path.join(path, "*")) if p.lower().endswith(image_extensions))
+        if not self.paths:
+            raise IOError(f"No images in {path}")
+        self.decoder = concurrent.futures.ThreadPoolExecutor(decode_threads)
+        self.decoding = collections.deque()
+        self.next_path = 0
+        self.image = None
+        super().__init__(fps, realtime, ring_size, policy, gray)
+        self.thread.start()
+
+    def release(self):
+        super().release()
+        self.decoder.shutdown(cancel_futures=True)
+
+    def _next(self):
+        while len(self.decoding) < self.ring_size and self.next_path < len(self.paths):
+            flags = cv2.IMREAD_GRAYSCALE if self.gray else cv2.IMREAD_COLOR
+            self.decoding.append(self.decoder.submit(cv2.imread, self.paths[self.next_path], flags))
+            self.next_path += 1
+        while self.decoding:
+            self.image = self.decoding.popleft().result()
+            if self.image is not None:
+                return True
+            # Not an image after all, skipped
+        return False
+
+    def _retrieve(self, buffer):
+        return self.image
+
+
+class ArraySource(_OfflineSource):
+    # Frames already in memory, a list of images or an array (frames, height, width[, 3])
+    def __init__(self, frames, fps=30.0, realtime=False, ring_size=8, policy="latest", gray=False):
+        self.frames = frames
+        self.position = -1
+        super().__init__(fps, realtime, ring_size, policy, gray)
+        self.thread.start()
+
+    def _next(self):
+        self.position += 1
+        return self.position < len(self.frames)
+
+    def _retrieve(self, buffer):
+        frame = self.frames[self.position]
+        return _to_gray(frame, buffer) if self.gray and frame.ndim == 3 else frame
+
+
+def open_source(source, width=640, height=480, ring_size=8, policy="latest", realtime=False, gray=False):
+    # source is a camera index, a video file, a directory of images or frames in memory
+    # width and height only apply to a camera, realtime only to the others
+    if isinstance(source, int):
+        return Capture(source, width, height, ring_size, policy, gray)
+    if isinstance(source, str) and os.path.isdir(source):
+        return ImageDirectorySource(source, realtime=realtime, ring_size=ring_size, policy=policy, gray=gray)
+    if isinstance(source, str):
+        return VideoFileSource(source, realtime=realtime, ring_size=ring_size, policy=policy, gray=gray)
+    return ArraySource(source, realtime=realtime, ring_size=ring_size, policy=policy, gray=gray)
@@ -1,176 +1,380 @@
 import cv2
 import numpy as np
-import tensorflow as tf
-import uuid
 import time
 import threading
 import os
 
 from gui.GUI_module import GUI
+from fomo_model import FomoModel
+from motion_gate import MotionGate
+from belt_roi import resolve_roi, crop
+from tiling import make_tiles, to_frame_pixels, merge_overlaps
+from tracker import Tracker
+from capture import open_source
+from broadcast import FrameBroadcaster
+from belt import Belt
+from recorder import VideoRecorder
 
-# Load TFLite model and labels
 here = os.path.dirname(os.path.realpath(__file__))
-model_path = os.path.join(here, "trained.tflite")
-labels_path = os.path.join(here, "labels.txt")
-
-interpreter = tf.lite.Interpreter(model_path=model_path)
-interpreter.allocate_tensors()
-
-with open(labels_path, "r") as f:
-    labels = [line.strip() for line in f.readlines()]
-
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-out_scale, out_zero_point = output_details[0]['quantization']
 
 # Parameters
 # You can adjust these for possible better performance
 # line_y is the distance of the counting line from the top of the screen
-# max_tracking_distance changes how fast you can move the conveyor
-# smaller distance means the nut gets counted as a new one more sensitively
+# zones are where nuts are counted as (name, points), two points make a line and more a
+# polygon. A line counts the nuts crossing it from its left to its right side looking from
+# the first point to the second (drawn left to right it counts nuts moving down), a polygon
+# the nuts entering it. Each zone counts each class separately, the GUI shows the first zone
+# conveyor_direction is the direction the belt is driven in (direction of
+# conveyor_belt_distance), -1 runs it backwards and the lines count the other way
+# max_tracking_distance is how far (pixels) from where it should be by the belt speed a nut
+# is still the same nut, smaller distance means it gets counted as a new one more sensitively
+# max_disappeared_frames is how many counted frames a nut may go unseen before it's forgotten,
+# frames the capture dropped because counting was busy don't count
+# belt_speed is the speed the conveyor is driven at in mm/s (speed_mm_per_sec of
+# conveyor_belt_distance), pixels_per_mm and belt_direction (x, y in the image, towards
+# the counting line) turn it to image pixels. None estimates the belt speed from the nuts
+# min_visible_area is how many grid cells a blob needs to be counted as a nut, each blob on its
+# own. A nut is only 1 to 4 cells of the impulse 2 grid (most 1 to 3), so keep it at 1 or 2
+# inference_workers is how many frames are inferred in parallel, about one per CPU core
+# inference_batch_size > 1 runs several frames per invoke, waiting at most
+# max_batch_wait seconds for the batch to fill (for replay and several cameras)
+# model_dirs are the models to choose from, press "m" in the video window to switch
+# to the next one while running, e.g. the faster impulse 1 when the PC is busy
+model_dirs = [os.path.join(here, "..", "Inference - impulse 2- 180 X 180"),
+              os.path.join(here, "..", "Inference - impulse 1 - 160 x 160")]
+# The motion gate skips the model when the belt looks the same as in the last inferred frame
+# motion_threshold is the gray level change of a pixel, motion_min_changed the fraction
+# of changed pixels needed to run the model, at least every max_skipped_frames frames
+# belt_roi is the part of the frame showing the belt as (x, y, w, h), only that is sent
+# to the model. None uses the whole frame, "auto" looks for the dark belt in the first frame
+# frame_source is a camera index, a video file or a directory of images to count offline,
+# e.g. os.path.join(here, "..", "M6.class"). realtime_replay plays files at their frame rate like
+# a camera, otherwise they run as fast as the PC counts, every frame is counted and the frame
+# rate printed at the end
+# capture_width x capture_height is the camera resolution asked for (MJPEG), the zones and
+# line_y are in its pixels. 320x240 is enough for the models without tiled_inference
+# capture_gray gets the frames as gray, which is what the models take, the colour conversion is
+# skipped where the camera driver allows it
+# The camera is read on its own thread into capture_ring_size frame buffers, more than the
+# frames in inference at once (inference_workers * inference_batch_size + 1) and the frames
+# waiting for counting (half the buffers) and any other subscriber together. When counting
+# falls behind, capture_policy "latest" always counts the newest frame and "drop_oldest"
+# keeps the frames in order, dropping the oldest one when the buffers are full
+# tiled_inference cuts the belt ROI into tiles of the model input size overlapping by
+# tile_overlap pixels, for cameras with a higher resolution than the model. Nuts found in two
+# tiles closer than tile_merge_distance are merged. Set inference_batch_size to the number of
+# tiles so a frame's tiles run in one invoke
+# belts are the conveyors counted at once as (name, frame_source, belt_roi, zones), each with
+# its own camera, tracker and counters but all sharing the model's inference_workers. The
+# belts take turns, none gets more than its share of the workers however fast its camera
+# runs. Each belt has its own window and the GUI shows the sum of their first zones. Keep
+# capture_ring_size per camera, e.g. [("Belt 1", 0, None, zones), ("Belt 2", 1, None, zones)]
+# A belt's frame_source can also be the FrameBroadcaster of a camera another part of the same
+# program already uses, counting is then one more subscriber (see the Dobot conveyor script)
+# record_video saves each belt's video for checking miscounts: "annotated" the frames as shown
+# in the window, "raw" the camera frames, None nothing. It's written at record_fps into
+# record_dir in files of record_segment_seconds, keeping the newest record_segments files.
+# Recording never holds up counting, frames the encoder can't keep up with are dropped
 min_confidence = 0.1
-min_visible_area = 5
+min_visible_area = 1
 max_tracking_distance = 50
 max_disappeared_frames = 10
 line_y = 400
+inference_workers = 2
+inference_batch_size = 1
+max_batch_wait = 0.05
+motion_gate = True
+motion_threshold = 10
+motion_min_changed = 0.001
+max_skipped_frames = 30
+belt_roi = None
+frame_source = 0
+capture_width = 640
+capture_height = 480
+capture_gray = True
+realtime_replay = False
+capture_ring_size = 12
+capture_policy = "latest"
+tiled_inference = False
+tile_overlap = 40
+tile_merge_distance = 20
+belt_speed = None
+pixels_per_mm = 4.0
+belt_direction = (0, 1)
+zones = [("Counting Line", [(0, line_y), (capture_width, line_y)])]
+conveyor_direction = 1
+belts = [("Belt", frame_source, belt_roi, zones)]
+record_video = None
+record_dir = os.path.join(here, "recordings")
+record_fps = 10
+record_segment_seconds = 300
+record_segments = 12
 
 colors = [(255, 0, 0), (0, 255, 0), (255, 255, 0), (0, 0, 255)]
 nut_classes = ["m6", "m8", "m10", "m12"]
-# Create a dictionary to keep track of the total nuts and their counts
-# The nut counts are initialized to 0
-nut_count = {nut: 0 for nut in nut_classes}
-tracked_nuts = []
-
-class TrackedObject:
-    def __init__(self, nut_type, position):
-        self.id = str(uuid.uuid4())[:8]
-        self.nut_type = nut_type
-        self.position = position
-        self.prev_position = position
-        self.last_seen = time.time()
-        self.counted = False
-
-def euclidean(p1, p2):
-    return np.sqrt((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2)
-
-def match_or_create(nut_label, position):
-    # Check if the nut is already being tracked and if it's within the tracking distance
-    # in that case update its position and last seen time
-    # and return the tracked nut
-    # otherwise create a new tracked nut and return it
-
-    for nut in tracked_nuts:
-        if nut.nut_type == nut_label and euclidean(nut.position, position) < max_tracking_distance: 
-            nut.prev_position = nut.position
-            nut.position = position
-            nut.last_seen = time.time()
-            return nut
-    new_nut = TrackedObject(nut_label, position)
-    tracked_nuts.append(new_nut)
-    return new_nut
-
-def preprocess_frame(frame):
-    # Its important to resize the frame to the same size as the model input
-    # and convert it to grayscale
-    # The model input size is 160x160 in this case
-    resized = cv2.resize(frame, (160, 160))
-    gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
-    if input_details[0]['dtype'] == np.int8:
-        normalized = (gray.astype(np.float32) - 127.5) / 127.5
-        input_frame = np.round(normalized * 127).astype(np.int8)
-    else:
-        input_frame = gray.astype(np.float32) / 255.0
-    input_frame = np.expand_dims(input_frame, axis=-1)
-    input_frame = np.expand_dims(input_frame, axis=0)
-    return input_frame
+# The belts being counted, each keeps the total nuts counted in its zones per class
+running_belts = []
+# Set by the GUI's reset button, the counting thread zeroes the counters before its next update
+reset_requested = threading.Event()
 
-def run_camera(gui):
-    # Initialize the camera
+def open_belts():
+    # Initialize the cameras (or the video files or images)
     # Change the camera index if needed (Usually 0 for built-in, 1 for external)
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    # Every frame comes with the time it was captured and its number
+    # Each belt's broadcaster shares its frames with anything else that subscribes (e.g. a
+    # recorder), counting gets them read-only through its own subscription
+    for name, belt_source, roi, belt_zones in belts:
+        if isinstance(belt_source, FrameBroadcaster):
+            source, broadcaster = belt_source.source, belt_source
+        else:
+            source = open_source(belt_source, capture_width, capture_height, capture_ring_size, capture_policy,
+                                 realtime_replay, capture_gray)
+            broadcaster = None
+        if hasattr(source, "mode"):
+            print("{} camera mode {} {}x{}".format(name, *source.mode()))
+        tracker = Tracker(max_tracking_distance, max_disappeared_frames)
+        if belt_speed is not None:
+            tracker.set_belt_velocity(np.array(belt_direction) / np.hypot(*belt_direction) *
+                                      belt_speed * pixels_per_mm * conveyor_direction)
+        gate = MotionGate(motion_threshold, motion_min_changed, max_skipped_frames) if motion_gate else None
+        # The nut counts are initialized to 0
+        belt = Belt(name, source, belt_zones, len(nut_classes), tracker, gate, roi,
+                    conveyor_direction, capture_ring_size // 2, broadcaster)
+        if record_video:
+            belt.recorder = VideoRecorder(record_dir, name, record_fps, record_segment_seconds, record_segments)
+            if record_video == "raw":
+                # Read-only camera frames from the broadcaster, counting doesn't see the recorder
+                belt.recorder.follow(belt.broadcaster.subscribe("recorder", max_fps=record_fps))
+        running_belts.append(belt)
+
+def load_model(model_dir):
+    # Classes the model knows but the counters don't yet are added to the end
+    model = FomoModel(model_dir, min_confidence, min_visible_area,
+                      inference_workers, inference_batch_size, max_batch_wait)
+    for nut in model.classes:
+        if nut not in nut_classes:
+            nut_classes.append(nut)
+    for belt in running_belts:
+        belt.zone_counter.add_classes(len(nut_classes))
+    # Counter index of each model channel, the tracker works with these numbers
+    model.counter_index = np.array([nut_classes.index(nut) for nut in model.classes], dtype=np.int32)
+    print(f"Model {model.name}: input {model.input_w}x{model.input_h}, "
+          f"grid {model.grid_w}x{model.grid_h}, classes {model.classes}")
+    return model
+
+def switch_model(model, model_dir):
+    # Load the new model first so counting only pauses for the frames in flight
+    # Those are dropped, tracks are in frame pixels so they carry over to the new model
+    new_model = load_model(model_dir)
+    while model.pool.in_flight():
+        frame, (belt, _, _, last_tile), _ = model.pool.get()
+        # A frame goes back to its belt once, with its last tile
+        if last_tile:
+            belt.cap.recycle(frame)
+            belt.in_flight -= 1
+    model.close()
+    for belt in running_belts:
+        if belt.gate is not None:
+            belt.gate.reset()
+        # The tiles follow the input size of the model
+        belt.tiles = None
+    return new_model
+
+def submit_frame(belt, model, captured):
+    frame, timestamp, _ = captured
+    if belt.roi is None:
+        belt.roi = resolve_roi(belt.belt_roi, frame)
+    if belt.tiles is None:
+        belt.tiles = make_tiles(belt.roi, model.input_w, model.input_h, tile_overlap) if tiled_inference else [belt.roi]
+
+    # Unchanged frames don't run the model, they reuse the detections of the belt's frame before
+    # (key=belt, the belts share the pool and may have the same tiles)
+    infer = belt.gate is None or belt.gate.changed(crop(frame, belt.roi))
+    submitted = time.monotonic()
+    for number, tile in enumerate(belt.tiles):
+        model.pool.submit(frame, infer, tile, (belt, timestamp, submitted, number == len(belt.tiles) - 1),
+                          key=belt)
+    belt.in_flight += 1
+
+def count_frame(belt, model, results):
+    # results are the tiles of one frame from the pool, returns the frame to show
+    captured_frame, (_, timestamp, _, _), _ = results[0]
+    # The captured frame is shared read-only, drawing happens on a copy (in colour for gray frames)
+    if belt.display is None or belt.display.shape[:2] != captured_frame.shape[:2]:
+        belt.display = np.empty(captured_frame.shape[:2] + (3,), dtype=np.uint8)
+    if captured_frame.ndim == 2:
+        frame = cv2.cvtColor(captured_frame, cv2.COLOR_GRAY2BGR, dst=belt.display)
+    else:
+        np.copyto(belt.display, captured_frame)
+        frame = belt.display
+
+    # The detections are in output grid cells of each tile, the grid size comes
+    # from the model. Tracking and drawing happen in full frame pixels
+    tiles = belt.tiles
+    classes, centers, confidences, areas, tile_numbers = to_frame_pixels([result for _, _, result in results],
+                                                                         tiles, model.grid_w, model.grid_h)
+    if len(tiles) > 1:
+        classes, centers, confidences, areas = merge_overlaps(classes, centers, confidences, areas, tile_numbers,
+                                                              tiles, tile_merge_distance)
+
+    # Create dictionary to keep track of visible nuts
+    # and their counts in the current frame
+
+    visible_now = {nut: 0 for nut in nut_classes}
+
+    # The model's channel order isn't the counting order, map by label
+    frame_classes = model.counter_index[classes]
+    # All detections are matched to the belt's tracks at once, nearest pairs first and
+    # whatever their class. Each track's class is the confidence weighted vote
+    # of its detections, a nut is counted as that class
+    # Tracks age by the frames this belt's tracker saw, frames dropped before counting don't count
+    tracker = belt.tracker
+    belt.tracked_frames += 1
+    slots = tracker.update(frame_classes, centers, timestamp, belt.tracked_frames, confidences)
+
+    # Check which nuts crossed a counting line or entered a zone and haven't been
+    # counted there yet, all zones at once. Then count them and mark them as counted
+    store = tracker.store
+    zone_counter = belt.zone_counter
+    # Crossings against the belt's way aren't counted, they're kept in reverse_counts
+    if reset_requested.is_set():
+        reset_requested.clear()
+        for running_belt in running_belts:
+            running_belt.zone_counter.reset_counts()
+    zone_counter.update(store, slots)
+
+    for idx, (cx, cy), track_id in zip(store.nut_class[slots], centers, store.ids[slots]):
+        nut_label = nut_classes[idx]
+        color = colors[idx % len(colors)]
+        x, y = int(cx), int(cy)
+        visible_now[nut_label] += 1
+
+        cv2.circle(frame, (x, y), 12, color, -1)
+        cv2.putText(frame, f"{nut_label.upper()} #{track_id}", (x + 15, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    tracker.expire(belt.tracked_frames)
+    belt.visible_now = visible_now
+
+    roi_x, roi_y, roi_w, roi_h = belt.roi
+    cv2.rectangle(frame, (roi_x, roi_y), (roi_x + roi_w, roi_y + roi_h), (128, 128, 128), 1)
+    for name, points, counts, reverse in zip(zone_counter.names, zone_counter.points, zone_counter.counts,
+                                             zone_counter.reverse_counts):
+        cv2.polylines(frame, [points.astype(np.int32)], len(points) > 2, (0, 0, 255), 2)
+        cv2.putText(frame, f"{name} {counts.sum()} (back {reverse.sum()})", (int(points[0][0]) + 10, int(points[0][1]) - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    cv2.putText(frame, f"{model.name} {belt.fps():.1f} fps", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    if belt.gate is not None:
+        cv2.putText(frame, f"Skipped {belt.gate.skip_ratio():.0%}", (10, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(frame, f"Dropped {belt.source.dropped + belt.cap.dropped}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    if record_video == "annotated":
+        # Copied for the recorder's thread, which encodes it while counting goes on
+        belt.recorder.record(frame, timestamp)
+
+    # The frame buffer goes back to the camera thread once every subscriber is done with it
+    belt.cap.recycle(captured_frame)
+    belt.counted(results[0][1][2])
+    return frame
+
+def window_name(belt):
+    return "Nut Detection" if len(running_belts) == 1 else f"Nut Detection - {belt.name}"
+
+def run_camera(gui=None):
+    # gui=None counts without the counts window, e.g. next to another program's own GUI
+    # The belts are opened here unless they already were, e.g. to subscribe before a
+    # shared broadcaster starts
+    if not running_belts:
+        open_belts()
+    model_index = 0
+    model = load_model(model_dirs[model_index])
+    # The GUI shows every class the counters know, the model may have added some
+    if gui is not None:
+        gui.set_classes(nut_classes)
+    for belt in running_belts:
+        belt.start()
+    # The frames all belts together keep in the pool, enough to keep every interpreter busy
+    pool_frames = inference_workers * inference_batch_size
+    next_belt = 0
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        # At the end of a video the frames still in inference are counted before stopping
+        active = [belt for belt in running_belts if not belt.finished()]
+        if not active:
             break
-
-        # Create dictionary to keep track of visible nuts
-        # and their counts in the current frame
-
-        visible_now = {nut: 0 for nut in nut_classes}
-        input_frame = preprocess_frame(frame)
-
-        interpreter.set_tensor(input_details[0]['index'], input_frame)
-        interpreter.invoke()
-        output = interpreter.get_tensor(output_details[0]['index'])
-        real_output = out_scale * (output.astype(np.float32) - out_zero_point)
-        real_output = real_output[0]
-
-        model_w, model_h = 20, 20
-        x_scale = frame.shape[1] / model_w
-        y_scale = frame.shape[0] / model_h
-
-        for idx, nut_label in enumerate(nut_classes):
-            channel_map = real_output[:, :, idx + 1]
-            conf_mask = channel_map > min_confidence
-            visible_area = np.sum(conf_mask)
-
-            if visible_area >= min_visible_area:
-                row, col = np.unravel_index(np.argmax(channel_map), channel_map.shape)
-                x, y = int(col * x_scale), int(row * y_scale)
-
-                tracked = match_or_create(nut_label, (x, y))
-                visible_now[nut_label] += 1
-
-
-                # Check if the nut has crossed the counting line and hasn't been counted yet
-                # Then count it and mark it as counted
-                if not tracked.counted and tracked.prev_position[1] < line_y <= tracked.position[1]:
-                    nut_count[nut_label] += 1
-                    tracked.counted = True
-
-                cv2.circle(frame, (x, y), 12, colors[idx], -1)
-                cv2.putText(frame, f"{nut_label.upper()} #{tracked.id}", (x + 15, y),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[idx], 2)
-
-        current_time = time.time()
-        tracked_nuts[:] = [nut for nut in tracked_nuts if current_time - nut.last_seen <= max_disappeared_frames / 30.0]
-
-        cv2.line(frame, (0, line_y), (frame.shape[1], line_y), (0, 0, 255), 2)
-        cv2.putText(frame, "Counting Line", (10, line_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-
-        # Update the GUI with the current and total counts
-        # The current counts are the number of visible nuts in the current frame
+        # Each belt gets an equal share of the pool, taking turns starting one belt later
+        # each time so a fast camera can't keep the others waiting
+        share = -(-pool_frames // len(active))
+        submitted = False
+        for turn in range(len(running_belts)):
+            belt = running_belts[(next_belt + turn) % len(running_belts)]
+            if belt.in_flight < share:
+                captured = belt.cap.read(block=False)
+                if captured is not None:
+                    submit_frame(belt, model, captured)
+                    submitted = True
+        next_belt = (next_belt + 1) % len(running_belts)
+        if not model.pool.in_flight():
+            # Waiting for the cameras
+            time.sleep(0.001)
+            continue
+        if submitted and sum(belt.in_flight for belt in running_belts) < pool_frames:
+            continue
+
+        # The results come back in the same order as the frames, whichever belt they're from
+        first = model.pool.get()
+        belt = first[1][0]
+        results = [first] + [model.pool.get() for _ in belt.tiles[1:]]
+        frame = count_frame(belt, model, results)
+
+        # Update the GUI with the current and total counts of all belts together
+        # The current counts are the number of visible nuts in the belts' latest frames
         # The total counts are the total number of nuts counted which have crossed the counting line so far
-        # The update_counts method takes two lists of length 5 as arguments
-        # We need to access the values from the visible_now and nut_count dictionaries to pass them to the method
-        current = [visible_now[n] for n in nut_classes]
-        total = [nut_count[n] for n in nut_classes]
-        gui.update_counts(current + [sum(current)], total + [sum(total)])
-        
-        cv2.imshow("Nut Detection", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        # The update_counts method takes two lists with one value per class and their sum as arguments
+        # We need to access the values from the visible_now dictionaries and the first zones' counts to pass them to the method
+        # It only hands the lists over, the GUI thread shows the newest ones 10 times a second
+        current = [sum(b.visible_now.get(n, 0) for b in running_belts) for n in nut_classes]
+        total = sum(b.zone_counter.counts[0] for b in running_belts).tolist()
+        if gui is not None:
+            gui.update_counts(current + [sum(current)], total + [sum(total)])
+
+        cv2.imshow(window_name(belt), frame)
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
             break
+        if key == ord('m') and len(model_dirs) > 1:
+            model_index = (model_index + 1) % len(model_dirs)
+            model = switch_model(model, model_dirs[model_index])
+            if gui is not None:
+                gui.set_classes(nut_classes)
 
 
     # Free resources and stop the program if "q" is pressed
-    cap.release()
-    cv2.destroyAllWindows()
-    gui.destroy()
+    for belt in running_belts:
+        print(belt.metrics())
+        for name, counts, reverse in zip(belt.zone_counter.names, belt.zone_counter.counts, belt.zone_counter.reverse_counts):
+            print(f"{belt.name} {name}: " + ", ".join(f"{nut.upper()} {count}" for nut, count in zip(nut_classes, counts)) +
+                  "; crossed back " + ", ".join(f"{nut.upper()} {count}" for nut, count in zip(nut_classes, reverse)))
+        belt.close()
+        # Only counting's own windows, a program sharing the camera may still show its own
+        if belt.counted_frames:
+            cv2.destroyWindow(window_name(belt))
+    model.close()
+    if gui is not None:
+        gui.close()
 
 
 
-if __name__ == "__main__":
-    gui = GUI(current_values=[0, 0, 0, 0, 0], total_values=[0, 0, 0, 0, 0])
+def main():
+    # The GUI and counting, also started by the copies in the model directories
+    gui = GUI(classes=nut_classes)
 
     def reset_everything():
-        # Reset the counts in the GUI and the nut_count dictionary holding the actual values
-        zero_values = [0, 0, 0, 0, 0]
+        # Reset the counts in the GUI and the belts' zone counters holding the actual values
+        # The counters belong to the counting thread, it resets them before the next frame
+        zero_values = [0] * (len(nut_classes) + 1)
         gui.update_counts(zero_values, zero_values)
-        for nut in nut_classes:
-            nut_count[nut] = 0
+        reset_requested.set()
 
     # We pass this reset function as an argument for the gui class to use
     # We don't call the reset function here, it gets executed with each press of reset
@@ -184,3 +388,7 @@ if __name__ == "__main__":
     # GUI must be run on main thread!
     gui.mainloop()
 
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+# FOMO post-processing
+# The model outputs a grid (e.g. 20x20) with one channel per label,
+# channel 0 being the background. Every blob of cells above the threshold
+# in a class channel is one object, so two nuts of the same size in the
+# same frame give two detections instead of one.
+# Quantized models are thresholded on the raw int8 grid, only the cells
+# that pass get converted to real confidences.
+
+
+def quantize_threshold(min_confidence, scale, zero_point, dtype):
+    # Convert a confidence threshold to the raw output domain, once at model load
+    # raw > threshold is then the same test as scale * (raw - zero_point) > min_confidence
+    if not np.issubdtype(dtype, np.integer) or not scale:
+        return min_confidence
+    info = np.iinfo(dtype)
+    threshold = int(np.floor(min_confidence / scale + zero_point))
+    return min(max(threshold, info.min), info.max)
+
+
+def decode_fomo(grid, threshold, min_area=1, scale=1.0, zero_point=0, first_class=1):
+    # grid is the model output without the batch dimension, shape (h, w, channels)
+    # For quantized models pass the raw grid, the threshold from quantize_threshold
+    # and the output quantization, for float models the defaults are fine
+    # Returns four arrays, one row per detected object:
+    #   classes      class index, 0 being the first channel after the background
+    #   centers      (x, y) centroid in grid cell units, weighted by confidence
+    #   confidences  the highest confidence inside the blob
+    #   areas        number of grid cells in the blob
+    # Multiply the centers with the frame size / grid size to get pixels
+    h, w, channels = grid.shape
+    num_classes = channels - first_class
+
+    # Lay the class channels side by side with an empty column between them,
+    # so a single connected components pass labels the blobs of every class
+    mosaic = np.zeros((h, num_classes, w + 1), dtype=np.uint8)
+    mosaic[:, :, :w] = (grid[:, :, first_class:] > threshold).transpose(0, 2, 1)
+    mosaic = mosaic.reshape(h, num_classes * (w + 1))
+
+    count, labels = cv2.connectedComponents(mosaic, connectivity=8)
+    if count <= 1:
+        return _no_detections()
+
+    rows, mosaic_cols = np.nonzero(labels)
+    ids = labels[rows, mosaic_cols]
+    cell_classes = mosaic_cols // (w + 1)
+    cols = mosaic_cols - cell_classes * (w + 1)
+    # Only the cells that passed the threshold are dequantized
+    weights = scale * (grid[rows, cols, cell_classes + first_class].astype(np.float32) - zero_point)
+
+    # Per blob sums in one go, +0.5 puts the coordinate at the middle of the cell
+    weight_sum = np.bincount(ids, weights, minlength=count)
+    center_x = np.bincount(ids, weights * (cols + 0.5), minlength=count)
+    center_y = np.bincount(ids, weights * (rows + 0.5), minlength=count)
+    areas = np.bincount(ids, minlength=count)
+    peaks = np.zeros(count, dtype=np.float32)
+    np.maximum.at(peaks, ids, weights)
+    classes = np.zeros(count, dtype=np.intp)
+    classes[ids] = cell_classes
+
+    keep = areas >= min_area
+    keep[0] = False  # label 0 is everything below the threshold
+    centers = np.stack((center_x[keep], center_y[keep]), axis=1) / weight_sum[keep, None]
+    return classes[keep], centers.astype(np.float32), peaks[keep], areas[keep]
+
+
+def _no_detections():
+    return (np.zeros(0, dtype=np.intp), np.zeros((0, 2), dtype=np.float32),
+            np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.intp))
+
+
+if __name__ == "__main__":
+    # Checks decode_fomo on a made up 10x10 grid with the background and two classes:
+    # two separate one cell nuts of class 0 (the case a per class argmax counted once),
+    # a two cell nut of class 1 and the same grid quantized to int8
+    grid = np.zeros((10, 10, 3), dtype=np.float32)
+    grid[:, :, 0] = 1.0
+    grid[2, 2, 1] = 0.9
+    grid[7, 6, 1] = 0.6
+    grid[5, 1:3, 2] = (0.8, 0.4)
+    classes, centers, confidences, areas = decode_fomo(grid, 0.3)
+    order = np.lexsort((centers[:, 0], classes))
+    assert classes[order].tolist() == [0, 0, 1]
+    assert np.allclose(centers[order], [(2.5, 2.5), (6.5, 7.5), (1.5 + 0.4 / 1.2, 5.5)])
+    assert np.allclose(confidences[order], [0.9, 0.6, 0.8]) and areas[order].tolist() == [1, 1, 2]
+    assert len(decode_fomo(grid, 0.3, min_area=2)[0]) == 1
+    assert len(decode_fomo(grid, 0.95)[0]) == 0
+
+    scale, zero_point = 1 / 255, -128
+    raw = np.clip(np.round(grid / scale + zero_point), -128, 127).astype(np.int8)
+    threshold = quantize_threshold(0.3, scale, zero_point, raw.dtype)
+    quantized = decode_fomo(raw, threshold, 1, scale, zero_point)
+    assert np.array_equal(np.sort(quantized[0]), [0, 0, 1])
+    assert np.allclose(np.sort(quantized[2]), np.sort(confidences), atol=scale)
+    print("OK")
@@ -0,0 +1,65 @@
+import os
+
+from fomo import decode_fomo, quantize_threshold
+from inference_pool import InferencePool
+from tflite_backend import Interpreter
+
+# One Edge Impulse FOMO model directory (trained.tflite + labels.txt)
+# The input size, the output grid and the class order are read from the
+# model and its labels, so impulse 1 (160x160 -> 20x20) and impulse 2
+# (180x180 -> 23x23) work without changing any code.
+# labels.txt is in the same order as the output channels, with the
+# background first, e.g. background, M10, M12, M6, M8
+
+
+def load_interpreter(model_path):
+    # One thread per interpreter, the inference pool runs several of them side by side
+    interpreter = Interpreter(model_path=model_path, num_threads=1)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+class FomoModel:
+    def __init__(self, model_dir, min_confidence, min_visible_area,
+                 workers=1, batch_size=1, max_batch_wait=0.05):
+        self.model_dir = model_dir
+        self.name = os.path.basename(os.path.normpath(model_dir))
+        self.min_visible_area = min_visible_area
+
+        with open(os.path.join(model_dir, "labels.txt"), "r") as f:
+            labels = [line.strip() for line in f.readlines() if line.strip()]
+        if labels[0].lower() != "background":
+            raise ValueError(f"{model_dir}: the first label should be the background, not '{labels[0]}'")
+        # Class names in channel order, channel 0 (background) left out
+        self.classes = [label.lower() for label in labels[1:]]
+
+        model_path = os.path.join(model_dir, "trained.tflite")
+        interpreters = [load_interpreter(model_path) for _ in range(workers)]
+        input_detail = interpreters[0].get_input_details()[0]
+        output_detail = interpreters[0].get_output_details()[0]
+        _, self.input_h, self.input_w, _ = (int(n) for n in input_detail['shape'])
+        _, self.grid_h, self.grid_w, channels = (int(n) for n in output_detail['shape'])
+        if channels != len(labels):
+            raise ValueError(f"{model_dir}: the model has {channels} output channels but labels.txt has {len(labels)} labels")
+
+        self.out_scale, self.out_zero_point = output_detail['quantization']
+        if not self.out_scale:
+            # Float model, the output already holds the confidences
+            self.out_scale, self.out_zero_point = 1.0, 0
+        # The threshold in the model's own output format, so the raw int8 output
+        # can be thresholded every frame without converting it to float first
+        self.out_threshold = quantize_threshold(min_confidence, self.out_scale, self.out_zero_point,
+                                                output_detail['dtype'])
+
+        # Preprocessing, inference and decoding for each frame happen in the pool
+        self.pool = InferencePool(interpreters, self.postprocess, batch_size, max_batch_wait)
+
+    def postprocess(self, output):
+        # Runs on the pool's worker threads
+        # Every blob in every class channel is its own detection
+        # so several nuts of the same size in one frame are all tracked
+        return decode_fomo(output, self.out_threshold, self.min_visible_area,
+                           self.out_scale, self.out_zero_point)
+
+    def close(self):
+        self.pool.close()
@@ -12,91 +12,50 @@ class title_frame(customtkinter.CTkFrame):
         self.title.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="ew")
 
 
-class on_screen_frame(customtkinter.CTkFrame):
-    def __init__(self, master, values=None):
+class counts_frame(customtkinter.CTkFrame):
+    # A header and one label per nut class plus "All sizes", built from the class list
+    def __init__(self, master, header, classes, values=None):
         super().__init__(master)
 
-        # values = [m6, m8, m10, m12]
-        self.values = values if values is not None else [0, 0, 0, 0, 0]
+        # values = one per class and the sum of them last
+        self.values = list(values) if values is not None else [0] * (len(classes) + 1)
+        self.names = [nut.upper() for nut in classes] + ["All sizes"]
 
         self.grid_rowconfigure(0, weight=2)
-        self.grid_rowconfigure(1, weight=1)
-        self.grid_rowconfigure(2, weight=1)
-        self.grid_rowconfigure(3, weight=1)
-        self.grid_rowconfigure(4, weight=1)
-        self.grid_rowconfigure(5, weight=1)
+        for row in range(1, len(self.names) + 1):
+            self.grid_rowconfigure(row, weight=1)
 
         self.grid_columnconfigure(0, weight=1)
 
-        self.header = customtkinter.CTkLabel(self, text="On screen currently:", fg_color="gray30", font=("Arial", 16), corner_radius=6)
+        self.header = customtkinter.CTkLabel(self, text=header, fg_color="gray30", font=("Arial", 16), corner_radius=6)
         self.header.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="nsew")
 
-        self.m6_var = customtkinter.StringVar()
-        self.m6_var.set(f"M6: {self.values[0]}")
-        self.m8_var = customtkinter.StringVar()
-        self.m8_var.set(f"M8: {self.values[1]}")
-        self.m10_var = customtkinter.StringVar()
-        self.m10_var.set(f"M10: {self.values[2]}")
-        self.m12_var = customtkinter.StringVar()
-        self.m12_var.set(f"M12: {self.values[3]}")
-        self.all_sizes_var = customtkinter.StringVar()
-        self.all_sizes_var.set(f"All sizes: {self.values[4]}")
-
-        self.m6_label = customtkinter.CTkLabel(self, textvariable=self.m6_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m6_label.grid(row=1, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.m8_label = customtkinter.CTkLabel(self, textvariable=self.m8_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m8_label.grid(row=2, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.m10_label = customtkinter.CTkLabel(self, textvariable=self.m10_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m10_label.grid(row=3, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.m12_label = customtkinter.CTkLabel(self, textvariable=self.m12_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m12_label.grid(row=4, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.all_sizes_label = customtkinter.CTkLabel(self, textvariable=self.all_sizes_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.all_sizes_label.grid(row=5, column=0, padx=10, pady=(10, 0), sticky="ew")
-
+        self.vars = []
+        self.labels = []
+        for row, (name, value) in enumerate(zip(self.names, self.values), start=1):
+            var = customtkinter.StringVar()
+            var.set(f"{name}: {value}")
+            label = customtkinter.CTkLabel(self, textvariable=var, font=("Arial", 16), corner_radius=6, justify="left")
+            label.grid(row=row, column=0, padx=10, pady=(10, 0), sticky="ew")
+            self.vars.append(var)
+            self.labels.append(label)
 
+    def show(self, values):
+        # Only the labels whose value changed are touched
+        for i, (name, value) in enumerate(zip(self.names, values)):
+            if value != self.values[i]:
+                self.values[i] = value
+                self.vars[i].set(f"{name}: {value}")
 
 
+class on_screen_frame(counts_frame):
+    def __init__(self, master, classes, values=None):
+        super().__init__(master, "On screen currently:", classes, values)
 
-class totals_frame(customtkinter.CTkFrame):
-    def __init__(self, master, values=None):
-        super().__init__(master)
-
-        # values = [m6, m8, m10, m12]
-        self.values = values if values is not None else [0, 0, 0, 0, 0]
 
-        self.grid_rowconfigure(0, weight=2)
-        self.grid_rowconfigure(1, weight=1)
-        self.grid_rowconfigure(2, weight=1)
-        self.grid_rowconfigure(3, weight=1)
-        self.grid_rowconfigure(4, weight=1)
-        self.grid_rowconfigure(5, weight=1)
-
-        self.grid_columnconfigure(0, weight=1)
-
-        self.header = customtkinter.CTkLabel(self, text="Totals all time:", fg_color="gray30", font=("Arial", 16), corner_radius=6)
-        self.header.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="nsew")
-
-        self.m6_var = customtkinter.StringVar()
-        self.m6_var.set(f"M6: {self.values[0]}")
-        self.m8_var = customtkinter.StringVar()
-        self.m8_var.set(f"M8: {self.values[1]}")
-        self.m10_var = customtkinter.StringVar()
-        self.m10_var.set(f"M10: {self.values[2]}")
-        self.m12_var = customtkinter.StringVar()
-        self.m12_var.set(f"M12: {self.values[3]}")
-        self.all_sizes_var = customtkinter.StringVar()
-        self.all_sizes_var.set(f"All sizes: {self.values[4]}")
-
-        self.m6_label = customtkinter.CTkLabel(self, textvariable=self.m6_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m6_label.grid(row=1, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.m8_label = customtkinter.CTkLabel(self, textvariable=self.m8_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m8_label.grid(row=2, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.m10_label = customtkinter.CTkLabel(self, textvariable=self.m10_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m10_label.grid(row=3, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.m12_label = customtkinter.CTkLabel(self, textvariable=self.m12_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.m12_label.grid(row=4, column=0, padx=10, pady=(10, 0), sticky="ew")
-        self.all_sizes_label = customtkinter.CTkLabel(self, textvariable=self.all_sizes_var, font=("Arial", 16), corner_radius=6, justify="left")
-        self.all_sizes_label.grid(row=5, column=0, padx=10, pady=(10, 0), sticky="ew")
+class totals_frame(counts_frame):
+    def __init__(self, master, classes, values=None):
+        super().__init__(master, "Totals all time:", classes, values)
 
 
 class button_frame(customtkinter.CTkFrame):
@@ -111,7 +70,12 @@ class button_frame(customtkinter.CTkFrame):
 
 
 class GUI(customtkinter.CTk):
-    def __init__(self, current_values=None, total_values=None):
+    # update_counts, set_classes and close can be called from any thread, e.g. the
+    # camera thread for every frame. They only leave the newest counts (or the
+    # request to close) for the Tk thread, which picks them up refresh_ms apart
+    # (10 times a second), so Tk is only ever touched from its own thread and a
+    # burst of frames is one update on screen
+    def __init__(self, current_values=None, total_values=None, classes=None, refresh_ms=100):
         super().__init__()
 
         self.title("Nut counting software")
@@ -121,8 +85,16 @@ class GUI(customtkinter.CTk):
         # This will be set by the main program
         self.reset_callback_function = None
 
-        self.current_values = current_values if current_values is not None else [0, 0, 0, 0]
-        self.total_values = total_values if total_values is not None else [0, 0, 0, 0]
+        self.classes = list(classes) if classes is not None else ["m6", "m8", "m10", "m12"]
+        self.current_values = current_values if current_values is not None else [0] * (len(self.classes) + 1)
+        self.total_values = total_values if total_values is not None else [0] * (len(self.classes) + 1)
+        self.refresh_ms = refresh_ms
+
+        # The newest counts and class list waiting for the Tk thread, None when already shown
+        self.pending_lock = threading.Lock()
+        self.pending_counts = None
+        self.pending_classes = None
+        self.closing = False
 
         # Grid layout
         self.grid_rowconfigure(0, weight=1)
@@ -138,11 +110,10 @@ class GUI(customtkinter.CTk):
         self.button_frame = button_frame(self)
         self.button_frame.grid(row=2, column=0, columnspan=2, sticky="nsew")
 
-        self.on_screen_frame = on_screen_frame(self, values=self.current_values)
-        self.on_screen_frame.grid(row=1, column=0, sticky="nsew")
-
-        self.totals_frame = totals_frame(self, values=self.total_values)
-        self.totals_frame.grid(row=1, column=1, sticky="nsew")
+        self.on_screen_frame = None
+        self.totals_frame = None
+        self._build_count_frames()
+        self.after(self.refresh_ms, self._refresh)
 
     def set_reset_callback(self, callback_function):
         # This is used to pass an external function to this class
@@ -156,19 +127,58 @@ class GUI(customtkinter.CTk):
         if self.reset_callback_function:
             self.reset_callback_function()
 
+    def set_classes(self, classes):
+        # The nut classes to show, e.g. after loading a model that knows more of them
+        with self.pending_lock:
+            self.pending_classes = list(classes)
+
     def update_counts(self, current_values, total_values):
-        # Update the displayed values in the frames
-        self.on_screen_frame.m6_var.set(f"M6: {current_values[0]}")
-        self.on_screen_frame.m8_var.set(f"M8: {current_values[1]}")
-        self.on_screen_frame.m10_var.set(f"M10: {current_values[2]}")
-        self.on_screen_frame.m12_var.set(f"M12: {current_values[3]}")
-        self.on_screen_frame.all_sizes_var.set(f"All sizes: {current_values[4]}")
-
-        self.totals_frame.m6_var.set(f"M6: {total_values[0]}")
-        self.totals_frame.m8_var.set(f"M8: {total_values[1]}")
-        self.totals_frame.m10_var.set(f"M10: {total_values[2]}")
-        self.totals_frame.m12_var.set(f"M12: {total_values[3]}")
-        self.totals_frame.all_sizes_var.set(f"All sizes: {total_values[4]}")
+        # One value per class and the sum last, for each of the frames
+        # Replaces counts not shown yet, the screen only needs the newest ones
+        with self.pending_lock:
+            self.pending_counts = (list(current_values), list(total_values))
+
+    def close(self):
+        # Closes the window from the Tk thread, which ends mainloop()
+        with self.pending_lock:
+            self.closing = True
+
+    def _build_count_frames(self):
+        for frame in (self.on_screen_frame, self.totals_frame):
+            if frame is not None:
+                frame.destroy()
+
+        self.on_screen_frame = on_screen_frame(self, self.classes, values=self.current_values)
+        self.on_screen_frame.grid(row=1, column=0, sticky="nsew")
+
+        self.totals_frame = totals_frame(self, self.classes, values=self.total_values)
+        self.totals_frame.grid(row=1, column=1, sticky="nsew")
+
+    def _refresh(self):
+        # Runs on the Tk thread every refresh_ms
+        with self.pending_lock:
+            classes, self.pending_classes = self.pending_classes, None
+            counts, self.pending_counts = self.pending_counts, None
+            closing = self.closing
+        if closing:
+            self.destroy()
+            return
+
+        if classes is not None and classes != self.classes:
+            self.classes = classes
+            self.current_values = [0] * (len(classes) + 1)
+            self.total_values = [0] * (len(classes) + 1)
+            self._build_count_frames()
+        if counts is not None:
+            current_values, total_values = counts
+            # Counts from before a class list change don't fit the labels, the next ones will
+            if len(current_values) == len(self.classes) + 1 and len(total_values) == len(self.classes) + 1:
+                self.current_values = current_values
+                self.total_values = total_values
+                self.on_screen_frame.show(current_values)
+                self.totals_frame.show(total_values)
+
+        self.after(self.refresh_ms, self._refresh)
 
 
 # current_values = [1, 2, 44, 2, 10]  # Example current values
@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+from preprocess import FramePreprocessor
+
+# Several interpreters running on their own threads
+# The interpreter releases the GIL while invoking, so N interpreters keep
+# N cores busy. Frames are numbered when submitted and results are handed
+# back strictly in that order, the tracker depends on seeing frames in order.
+# With batch_size > 1 each worker collects up to batch_size frames (or tiles),
+# waiting at most max_batch_wait seconds for them, and runs them all in one
+# invoke(). That's for offline replay and several cameras, where throughput
+# matters more than the latency of a single frame.
+# Frames submitted with infer=False skip the model and get the result of the
+# frame before them with the same roi and key, e.g. when the motion gate saw no
+# change. The key keeps the results of several cameras apart when their rois are
+# the same.
+# info travels with the frame untouched, e.g. its capture timestamp and number.
+
+# Stands in for the result of a frame that reuses the previous result
+_previous_result = object()
+
+
+class InferencePool:
+    def __init__(self, interpreters, postprocess, batch_size=1, max_batch_wait=0.05):
+        # interpreters are loaded and allocated, one worker thread each
+        # postprocess gets the model output of one frame without the batch
+        # dimension and its return value is what get() hands back with the frame
+        self.interpreters = interpreters
+        self.postprocess = postprocess
+        self.batch_size = batch_size
+        self.max_batch_wait = max_batch_wait
+        self.tasks = queue.Queue(maxsize=2 * len(interpreters) * batch_size)
+        self.done = {}
+        self.done_changed = threading.Condition()
+        self.next_submitted = 0
+        self.next_returned = 0
+        self.last_results = {}  # (roi, key) -> result
+        self.inferred = set()  # (roi, key) that ran the model at least once
+
+        self.workers = []
+        for interpreter in interpreters:
+            worker = threading.Thread(target=self._work, args=(interpreter,), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, frame, infer=True, roi=None, info=None, key=None):
+        # Blocks when all workers are busy and the queue is full
+        # roi (x, y, w, h) infers only that part of the frame, get() still returns the whole frame
+        # infer=False hands back the previous result for the same roi and key (e.g. the
+        # camera), the first frame of each has nothing to reuse so it runs the model
+        reuse = (roi, key)
+        if infer or reuse not in self.inferred:
+            self.inferred.add(reuse)
+            self.tasks.put((self.next_submitted, frame, roi, info, reuse))
+        else:
+            with self.done_changed:
+                self.done[self.next_submitted] = (frame, reuse, info, _previous_result, None)
+        self.next_submitted += 1
+
+    def in_flight(self):
+        # Frames submitted but not yet returned by get()
+        return self.next_submitted - self.next_returned
+
+    def get(self):
+        # The result of the oldest frame still in flight, waits until it's ready
+        with self.done_changed:
+            while self.next_returned not in self.done:
+                self.done_changed.wait()
+            frame, reuse, info, result, error = self.done.pop(self.next_returned)
+        self.next_returned += 1
+        if error is not None:
+            raise error
+        if result is _previous_result:
+            result = self.last_results[reuse]
+        self.last_results[reuse] = result
+        return frame, info, result
+
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _work(self, interpreter):
+        input_detail = interpreter.get_input_details()[0]
+        if self.batch_size > 1:
+            _, height, width, channels = input_detail['shape']
+            interpreter.resize_tensor_input(input_detail['index'], [self.batch_size, height, width, channels])
+            interpreter.allocate_tensors()
+        preprocess = FramePreprocessor(interpreter, input_detail)
+        output_index = interpreter.get_output_details()[0]['index']
+
+        stopping = False
+        while not stopping:
+            task = self.tasks.get()
+            if task is None:
+                break
+            batch = [task]
+            deadline = time.monotonic() + self.max_batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    task = self.tasks.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if task is None:
+                    stopping = True
+                    break
+                batch.append(task)
+
+            results, error = [None] * len(batch), None
+            try:
+                # A batch that isn't full still runs at full size, the slots
+                # left over from the previous batch are just ignored
+                for slot, (_, frame, roi, _, _) in enumerate(batch):
+                    preprocess(frame, slot, roi)
+                interpreter.invoke()
+                output = interpreter.get_tensor(output_index)
+                results = [self.postprocess(output[slot]) for slot in range(len(batch))]
+            except Exception as e:
+                # Raised again in get(), in order, so no frame goes missing silently
+                error = e
+            with self.done_changed:
+                for (number, frame, _, info, reuse), result in zip(batch, results):
+                    self.done[number] = (frame, reuse, info, result, error)
+                self.done_changed.notify_all()
+
+
+if __name__ == "__main__":
+    # Check that two cameras sharing the pool with the same roi don't reuse each
+    # other's results: camera "A" sees an empty belt, camera "B" nuts. B's next
+    # frame is skipped as unchanged and has to get B's detections back, not A's
+    import glob
+    import os
+
+    import cv2
+    import numpy as np
+
+    from fomo_model import FomoModel
+
+    here = os.path.dirname(os.path.realpath(__file__))
+    model = FomoModel(os.path.join(here, "..", "Inference - impulse 2- 180 X 180"), 0.1, 1)
+    nuts = cv2.imread(sorted(glob.glob(os.path.join(here, "..", "M8.class", "*.jpg")))[0])
+    empty = np.zeros_like(nuts)
+    for frame, infer, key in ((empty, True, "A"), (nuts, True, "B"), (empty, True, "A"), (nuts, False, "B")):
+        model.pool.submit(frame, infer, key=key)
+    results = [model.pool.get()[2] for _ in range(4)]
+    model.close()
+    print(f"B inferred {len(results[1][0])} nuts, B skipped got {len(results[3][0])} back")
+    assert len(results[1][0]) and all(np.array_equal(a, b) for a, b in zip(results[1], results[3]))
+    print("OK")
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+
+# Cheap check before inference: has anything on the belt changed?
+# The conveyor moves in steps with pauses in between, so many frames in a row
+# look the same. The frame is shrunk to a small gray image and compared to
+# the last frame that went through the model. If hardly any pixels differ,
+# the previous detections are reused instead of running the network.
+
+
+class MotionGate:
+    def __init__(self, threshold=10, min_changed=0.001, max_skipped=30, size=(80, 60)):
+        # threshold     gray level difference that counts as a changed pixel
+        # min_changed   fraction of changed pixels needed to run the model
+        # max_skipped   run the model at least this often even if nothing changed
+        self.threshold = threshold
+        self.min_changed = int(np.ceil(min_changed * size[0] * size[1]))
+        self.max_skipped = max_skipped
+        self.size = size
+        self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.reference = np.empty_like(self.gray)
+        self.diff = np.empty_like(self.gray)
+        self.has_reference = False
+        self.skipped_in_row = 0
+        self.frames = 0
+        self.skipped = 0
+
+    def changed(self, frame):
+        # True when the frame should go through the model
+        self.frames += 1
+        if frame.ndim == 2:
+            cv2.resize(frame, self.size, dst=self.gray, interpolation=cv2.INTER_AREA)
+        else:
+            cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+        if self.has_reference and self.skipped_in_row < self.max_skipped:
+            cv2.absdiff(self.gray, self.reference, dst=self.diff)
+            cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+            if cv2.countNonZero(self.diff) < self.min_changed:
+                self.skipped += 1
+                self.skipped_in_row += 1
+                return False
+
+        # Compared to the last inferred frame, not the previous one, so a slow
+        # change adds up until it's big enough to notice
+        self.reference[:] = self.gray
+        self.has_reference = True
+        self.skipped_in_row = 0
+        return True
+
+    def reset(self):
+        # The next frame always goes through the model, e.g. after switching models
+        self.has_reference = False
+
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
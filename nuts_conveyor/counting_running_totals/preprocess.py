@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+
+# Frame preprocessing straight into the interpreter's input tensor
+# The resized and grayscale images live in buffers that are allocated once,
+# and the int8 (or float) conversion is a 256 entry lookup table, so a frame
+# goes from the camera to the model input without any new arrays. Gray frames
+# (from a camera giving gray) skip the colour conversion.
+
+
+def build_input_lut(dtype):
+    # Same conversion as the model was trained with, done once for every gray level
+    gray = np.arange(256, dtype=np.float32)
+    if dtype == np.int8:
+        normalized = (gray - 127.5) / 127.5
+        return np.round(normalized * 127).astype(np.int8)
+    return gray / 255.0
+
+
+class FramePreprocessor:
+    def __init__(self, interpreter, input_detail):
+        # input_detail is one entry of interpreter.get_input_details()
+        _, height, width, _ = input_detail['shape']
+        self.size = (int(width), int(height))
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.lut = build_input_lut(input_detail['dtype'])
+        # interpreter.tensor returns a function giving a view of the input buffer
+        # The view must not be kept around, invoke() refuses to run while it exists
+        self.input_view = interpreter.tensor(input_detail['index'])
+
+    def __call__(self, frame, slot=0, roi=None):
+        # slot is the position in the batch when the input has more than one frame
+        # roi (x, y, w, h) sends only that part of the frame to the model
+        if roi is not None:
+            x, y, w, h = roi
+            frame = frame[y:y + h, x:x + w]
+        # Its important to resize the frame to the same size as the model input
+        # and convert it to grayscale
+        if frame.ndim == 2:
+            cv2.resize(frame, self.size, dst=self.gray)
+        else:
+            cv2.resize(frame, self.size, dst=self.resized)
+            cv2.cvtColor(self.resized, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        # cv2.LUT writes into the tensor view, np.take would first copy the
+        # gray image to an index array
+        cv2.LUT(self.gray, self.lut, dst=self.input_view()[slot, :, :, 0])
@@ -0,0 +1,142 @@
+import collections
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from broadcast import RateLimit
+
+# Video recorder for checking miscounts afterwards
+# record() only copies the frame into one of a few buffers allocated once and
+# returns, the encoding happens on the recorder's own thread. When the encoder
+# falls behind and every buffer is waiting, the frame is dropped and counted
+# instead of holding up counting. Frames closer than 1 / fps (by their
+# timestamps) to the last recorded one are skipped, so a 30 fps camera can be
+# recorded at e.g. 10 fps.
+#
+# The video is written in segments of segment_seconds (of frame timestamps),
+# named by the time they start and their number. Only the newest max_segments
+# files are kept, older ones this recorder wrote are deleted, so it can run
+# for a whole shift.
+
+video_extensions = {"mp4v": ".mp4", "avc1": ".mp4", "XVID": ".avi", "MJPG": ".avi"}
+
+
+class VideoRecorder:
+    def __init__(self, directory, prefix="nuts", fps=10.0, segment_seconds=300, max_segments=12,
+                 queue_size=8, fourcc="mp4v"):
+        # max_segments=None keeps every file
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.queue_size = queue_size
+        self.fourcc = fourcc
+        self.buffers = []  # allocated with the size of the first frame
+        self.free = collections.deque(range(queue_size))
+        self.queued = collections.deque()  # (slot, timestamp) oldest first
+        self.changed = threading.Condition()
+        self.running = True
+        self.rate_limit = RateLimit(fps)
+        self.segments = collections.deque()  # files written, oldest first
+        self.segment_number = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.followers = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, frame, timestamp):
+        # Queues a copy of frame (BGR or gray) for the encoder, never waits for it
+        if not self.rate_limit.allows(timestamp):
+            return
+        with self.changed:
+            if not self.running:
+                return
+            if not self.buffers:
+                self.buffers = [np.empty_like(frame) for _ in range(self.queue_size)]
+            if not self.free:
+                self.dropped += 1
+                return
+            slot = self.free.popleft()
+        buffer = self.buffers[slot]
+        if frame.shape == buffer.shape:
+            np.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer)
+        with self.changed:
+            self.queued.append((slot, timestamp))
+            self.changed.notify_all()
+
+    def follow(self, subscription):
+        # Records the frames of a broadcaster subscription (the raw camera frames) on another
+        # thread, subscribe with max_fps=fps so the broadcaster skips the rest
+        def run():
+            while True:
+                captured = subscription.read()
+                if captured is None:
+                    break
+                frame, timestamp, _ = captured
+                self.record(frame, timestamp)
+                subscription.recycle(frame)
+
+        follower = threading.Thread(target=run, daemon=True)
+        self.followers.append((follower, subscription))
+        follower.start()
+
+    def close(self):
+        # Writes the frames still queued and closes the file
+        for follower, subscription in self.followers:
+            subscription.release()
+            follower.join()
+        with self.changed:
+            self.running = False
+            self.changed.notify_all()
+        self.thread.join()
+
+    def _open_segment(self, frame):
+        # The number keeps the names apart when a replay runs through segments faster than real time
+        self.segment_number += 1
+        name = (f"{self.prefix} {time.strftime('%Y%m%d-%H%M%S')} {self.segment_number:03d}"
+                f"{video_extensions.get(self.fourcc, '.avi')}")
+        path = os.path.join(self.directory, name)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps,
+                                 (frame.shape[1], frame.shape[0]), frame.ndim == 3)
+        if not writer.isOpened():
+            raise IOError(f"Can't write video {path} with {self.fourcc}")
+        self.segments.append(path)
+        while self.max_segments is not None and len(self.segments) > self.max_segments:
+            old = self.segments.popleft()
+            if os.path.exists(old):
+                os.remove(old)
+        return writer
+
+    def _run(self):
+        writer = None
+        segment_start = None
+        while True:
+            with self.changed:
+                while not self.queued and self.running:
+                    self.changed.wait()
+                if not self.queued:
+                    break
+                slot, timestamp = self.queued.popleft()
+            frame = self.buffers[slot]
+
+            if writer is None or timestamp - segment_start >= self.segment_seconds:
+                if writer is not None:
+                    writer.release()
+                writer = self._open_segment(frame)
+                segment_start = timestamp
+            writer.write(frame)
+            self.recorded += 1
+
+            with self.changed:
+                self.free.append(slot)
+
+        if writer is not None:
+            writer.release()
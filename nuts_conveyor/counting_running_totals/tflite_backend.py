@@ -0,0 +1,36 @@
+import os
+
+# The lightest TFLite runtime that is installed
+# Only the interpreter is needed, and importing the full TensorFlow takes
+# seconds and hundreds of MB just for that. ai_edge_litert (LiteRT) and
+# tflite_runtime are small packages with the same Interpreter class.
+# Set TFLITE_BACKEND to one of the names below to force a specific runtime.
+
+backends = ["ai_edge_litert", "tflite_runtime", "tensorflow"]
+
+
+def _import_interpreter(name):
+    if name == "ai_edge_litert":
+        from ai_edge_litert.interpreter import Interpreter
+    elif name == "tflite_runtime":
+        from tflite_runtime.interpreter import Interpreter
+    elif name == "tensorflow":
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    else:
+        raise ValueError(f"Unknown TFLite backend '{name}', use one of {backends}")
+    return Interpreter
+
+
+Interpreter = None
+backend = None
+for name in ([os.environ["TFLITE_BACKEND"]] if os.environ.get("TFLITE_BACKEND") else backends):
+    try:
+        Interpreter = _import_interpreter(name)
+        backend = name
+        break
+    except ImportError:
+        continue
+
+if Interpreter is None:
+    raise ImportError("No TFLite runtime found, install ai-edge-litert, tflite-runtime or tensorflow")
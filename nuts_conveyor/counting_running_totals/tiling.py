@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+
+# Tiled inference for cameras with more pixels than the model input
+# The belt ROI is cut into overlapping tiles of the model's input size, so the
+# model sees the small nuts (M6) at the camera's full resolution instead of
+# shrunk to a few grid cells. The tiles of a frame are submitted together and
+# the pool runs them as one batch. A nut lying in the overlap of two tiles is
+# found twice, those detections are merged before tracking.
+
+
+def _tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    # As few tiles as give at least the wanted overlap, spread evenly so the
+    # last tile ends exactly at the edge
+    count = math.ceil((length - overlap) / (tile - overlap))
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def make_tiles(roi, tile_w, tile_h, overlap):
+    # Tiles (x, y, w, h) covering the roi, neighbours overlap by overlap pixels
+    x, y, w, h = roi
+    return [(x + tx, y + ty, min(tile_w, w), min(tile_h, h))
+            for ty in _tile_starts(h, tile_h, overlap)
+            for tx in _tile_starts(w, tile_w, overlap)]
+
+
+def to_frame_pixels(results, tiles, grid_w, grid_h):
+    # Joins the decode_fomo results of the tiles into one set of detections,
+    # with the centers moved from grid cells of each tile to frame pixels
+    # The fifth array is the index of the tile each detection was found in
+    classes, centers, confidences, areas, tile_numbers = [], [], [], [], []
+    for number, (result, (x, y, w, h)) in enumerate(zip(results, tiles)):
+        tile_classes, tile_centers, tile_confidences, tile_areas = result
+        classes.append(tile_classes)
+        centers.append(tile_centers * (w / grid_w, h / grid_h) + (x, y))
+        confidences.append(tile_confidences)
+        areas.append(tile_areas)
+        tile_numbers.append(np.full(len(tile_classes), number, dtype=np.intp))
+    return (np.concatenate(classes), np.concatenate(centers).astype(np.float32),
+            np.concatenate(confidences), np.concatenate(areas), np.concatenate(tile_numbers))
+
+
+def merge_overlaps(classes, centers, confidences, areas, tile_numbers, tiles, merge_distance):
+    # The same nut found by two tiles is one nut: detections of different tiles,
+    # closer than merge_distance pixels and each inside the other's tile (give or
+    # take merge_distance, a nut cut by a tile edge is found a bit off) are merged,
+    # whatever their class (two tiles may disagree about it). Two nuts found in
+    # the same tile are never merged, however close. The most confident
+    # detection is kept, with at most one detection from each other tile merged
+    # into it, and its position is the confidence weighted average of those
+    if len(classes) < 2:
+        return classes, centers, confidences, areas
+    distance = np.linalg.norm(centers[:, None, :] - centers[None, :, :], axis=2)
+    rects = np.array(tiles, dtype=np.float32)[tile_numbers]
+    x, y = centers[:, 0:1], centers[:, 1:2]
+    # in_tile[i, j] is True when detection i is inside the tile of detection j
+    left, top = rects[None, :, 0] - merge_distance, rects[None, :, 1] - merge_distance
+    right, bottom = left + rects[None, :, 2] + 2 * merge_distance, top + rects[None, :, 3] + 2 * merge_distance
+    in_tile = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+    mergeable = ((distance < merge_distance) & (tile_numbers[:, None] != tile_numbers[None, :]) &
+                 in_tile & in_tile.T)
+
+    keep = []
+    merged = np.zeros(len(classes), dtype=bool)
+    merged_centers = centers.copy()
+    for i in np.argsort(-confidences):
+        if merged[i]:
+            continue
+        # The nearest detection of each other tile
+        others = np.flatnonzero(mergeable[i] & ~merged)
+        others = others[np.argsort(distance[i, others], kind="stable")]
+        others = others[np.unique(tile_numbers[others], return_index=True)[1]]
+        group = np.append(others, i)
+        merged[group] = True
+        weights = confidences[group]
+        merged_centers[i] = (centers[group] * weights[:, None]).sum(axis=0) / weights.sum()
+        keep.append(i)
+
+    keep = np.array(keep, dtype=np.intp)
+    return classes[keep], merged_centers[keep], confidences[keep], areas[keep]
+
+
+if __name__ == "__main__":
+    # Checks merge_overlaps on two tiles overlapping from x 60 to 100: a nut in the
+    # overlap found by both tiles is one nut, two nuts side by side in one tile and
+    # a nut of each tile close together but not in the overlap stay apart
+    tiles = make_tiles((0, 0, 160, 100), 100, 100, 40)
+    assert tiles == [(0, 0, 100, 100), (60, 0, 100, 100)]
+    classes = np.array([0, 1, 2, 2, 3, 3], dtype=np.intp)
+    centers = np.array([(80, 50), (84, 52), (10, 20), (20, 20), (40, 80), (140, 80)], dtype=np.float32)
+    confidences = np.array([0.9, 0.5, 0.8, 0.8, 0.7, 0.7], dtype=np.float32)
+    areas = np.ones(6, dtype=np.intp)
+    tile_numbers = np.array([0, 1, 0, 0, 0, 1], dtype=np.intp)
+    merged = merge_overlaps(classes, centers, confidences, areas, tile_numbers, tiles, 20)
+    assert sorted(merged[0].tolist()) == [0, 2, 2, 3, 3]
+    assert np.allclose(merged[1][merged[0] == 0], [(80 + 4 * 0.5 / 1.4, 50 + 2 * 0.5 / 1.4)])
+
+    # The tile each detection came from, in frame pixels
+    results = [(classes[:1], np.array([(16.0, 10.0)], dtype=np.float32), confidences[:1], areas[:1]),
+               (classes[1:2], np.array([(4.8, 10.4)], dtype=np.float32), confidences[1:2], areas[1:2])]
+    frame_pixels = to_frame_pixels(results, tiles, 20, 20)
+    assert np.allclose(frame_pixels[1], centers[:2]) and frame_pixels[4].tolist() == [0, 1]
+    print("OK")
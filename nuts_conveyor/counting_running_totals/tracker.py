@@ -0,0 +1,273 @@
+import collections
+
+import numpy as np
+
+# Tracks nuts from frame to frame
+# The tracks live in preallocated NumPy columns (TrackStore), a track is a
+# slot number in those columns and has an increasing integer id. Freed slots
+# go on a free list and are reused, so creating, updating and expiring tracks
+# doesn't create Python objects, it's all array operations.
+#
+# Each track has a velocity and is looked for where it should be now
+# (position + velocity * time since it was seen), so max_distance only has to
+# cover the prediction error, not how far the belt moves between frames. New
+# tracks start with the belt velocity: the speed the belt is driven at when
+# it's known (set_belt_velocity), otherwise a running estimate from the tracks.
+#
+# Matching uses a spatial hash: every frame the predicted positions are sorted
+# into a table of grid cells the size of max_distance, and each detection only
+# looks at the tracks in the 3x3 cells around it. The candidate pairs are then
+# assigned nearest first, so when two nuts lie close together each keeps its
+# own track. The table is built again every frame on purpose, every predicted
+# position moves with the elapsed time, so nearly every track changes cell
+# anyway. It's one sort of the live tracks, about 0.06 ms at 500 nuts.
+#
+# Detections are matched to tracks whatever their class, the model mixes up
+# similar nuts (M10 and M12) now and then. Each track adds up the confidence
+# of every class it was detected as, and its class is the one with the most
+# votes, decided again every frame and used when the nut is counted.
+#
+# Times come from the capture (capture timestamps), not the clock when the
+# frame is processed, velocities are per second of capture time. A track is
+# dropped after max_missed_frames frames the tracker was given without its
+# nut. Those are numbered by the caller, one per update, not by the capture:
+# a camera dropping frames for a busy PC would otherwise age the tracks by
+# frames nobody looked at. Ageing only looks at the tracks seen in the frame
+# that just got too old: the slots seen in each frame wait in a queue, oldest
+# frame first, and a slot is released when that frame is still the last one
+# its track was seen in.
+
+_hash_table_size = 4096  # power of two
+
+
+class TrackStore:
+    def __init__(self, capacity=1024, class_count=4):
+        self.position = np.zeros((capacity, 2), dtype=np.float32)
+        self.prev_position = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.last_frame = np.zeros(capacity, dtype=np.int64)
+        self.nut_class = np.zeros(capacity, dtype=np.int32)
+        self.votes = np.zeros((capacity, class_count), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # Free slots as a stack, the lowest slots are handed out first
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.intp)
+        self.free_count = capacity
+        self.next_id = 1
+
+    def capacity(self):
+        return len(self.alive)
+
+    def create(self, count):
+        # Slots for count new tracks, the store grows if it's full
+        if count > self.free_count:
+            self._grow(max(2 * self.capacity(), self.capacity() + count))
+        slots = self.free[self.free_count - count:self.free_count][::-1].copy()
+        self.free_count -= count
+        self.ids[slots] = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+        self.alive[slots] = True
+        self.votes[slots] = 0
+        return slots
+
+    def release(self, slots):
+        self.alive[slots] = False
+        self.free[self.free_count:self.free_count + len(slots)] = slots[::-1]
+        self.free_count += len(slots)
+
+    def _grow(self, capacity):
+        old = self.capacity()
+        for name in ("position", "prev_position", "velocity", "last_seen", "last_frame", "nut_class", "votes", "ids", "alive"):
+            column = getattr(self, name)
+            grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:old] = column
+            setattr(self, name, grown)
+        # New slots go under the old free ones, the old ones are used first
+        free = np.empty(capacity, dtype=np.intp)
+        free[:capacity - old] = np.arange(capacity - 1, old - 1, -1)
+        free[capacity - old:capacity - old + self.free_count] = self.free[:self.free_count]
+        self.free = free
+        self.free_count += capacity - old
+
+    def add_classes(self, class_count):
+        # More vote columns, e.g. for a model with classes the counters didn't have yet
+        votes = np.zeros((self.capacity(), class_count), dtype=np.float32)
+        votes[:, :self.votes.shape[1]] = self.votes
+        self.votes = votes
+
+
+class Tracker:
+    def __init__(self, max_distance, max_missed_frames, capacity=1024, velocity_smoothing=0.3, class_count=4):
+        # max_distance is how far (pixels) a nut may be from its predicted position
+        # max_missed_frames is how many frames a track is kept without seeing its nut
+        # velocity_smoothing is how much one frame changes a velocity (0..1)
+        self.max_distance = max_distance
+        self.max_missed_frames = max_missed_frames
+        self.velocity_smoothing = velocity_smoothing
+        self.store = TrackStore(capacity, class_count)
+        self.belt_velocity = np.zeros(2, dtype=np.float32)
+        self.belt_velocity_known = False
+        # (frame_number, slots seen in that frame) oldest first
+        self.seen_in_frame = collections.deque()
+
+    def set_belt_velocity(self, velocity):
+        # Belt velocity (vx, vy) in pixels per second from the speed the belt is
+        # driven at, None goes back to estimating it from the tracks
+        # The nuts on the belt move with it, e.g. when it's reversed
+        self.belt_velocity_known = velocity is not None
+        if velocity is not None:
+            self.belt_velocity[:] = velocity
+            self.store.velocity[self.store.alive] = self.belt_velocity
+
+    def update(self, nut_classes, positions, timestamp, frame_number, confidences=None):
+        # nut_classes (integers), positions (x, y) and confidences (the votes, 1
+        # each when None) of this frame's detections, timestamp (seconds) of the
+        # frame from the capture and frame_number counting the frames given to
+        # this tracker (1, 2, 3, ...)
+        # Returns the track slot of each detection, new tracks for nuts not seen before
+        store = self.store
+        nut_classes = np.asarray(nut_classes, dtype=np.int32)
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        confidences = np.ones(len(nut_classes), dtype=np.float32) if confidences is None else confidences
+        if len(nut_classes) and nut_classes.max() >= store.votes.shape[1]:
+            store.add_classes(nut_classes.max() + 1)
+        slots = np.full(len(nut_classes), -1, dtype=np.intp)
+
+        elapsed = (timestamp - store.last_seen).astype(np.float32)
+        predicted = store.position + store.velocity * elapsed[:, None]
+        pair_detections, pair_tracks = self._candidates(positions, predicted)
+        distance = np.linalg.norm(positions[pair_detections] - predicted[pair_tracks], axis=1)
+        close = distance < self.max_distance
+        pair_detections, pair_tracks, distance = pair_detections[close], pair_tracks[close], distance[close]
+
+        # Nearest pairs first, each detection and each track is used once
+        # A pair that is the nearest one for both its detection and its track is
+        # taken, the pairs of taken detections and tracks dropped, and so on
+        track_taken = np.zeros(store.capacity(), dtype=bool)
+        while len(distance):
+            order = np.argsort(distance, kind="stable")
+            pair_detections, pair_tracks, distance = pair_detections[order], pair_tracks[order], distance[order]
+            nearest_for_detection = np.zeros(len(distance), dtype=bool)
+            nearest_for_detection[np.unique(pair_detections, return_index=True)[1]] = True
+            nearest_for_track = np.zeros(len(distance), dtype=bool)
+            nearest_for_track[np.unique(pair_tracks, return_index=True)[1]] = True
+            taken = nearest_for_detection & nearest_for_track
+            slots[pair_detections[taken]] = pair_tracks[taken]
+            track_taken[pair_tracks[taken]] = True
+            left = (slots[pair_detections] < 0) & ~track_taken[pair_tracks]
+            pair_detections, pair_tracks, distance = pair_detections[left], pair_tracks[left], distance[left]
+
+        matched = slots >= 0
+        moved = slots[matched]
+        self._update_velocities(moved, positions[matched], elapsed[moved])
+        store.prev_position[moved] = store.position[moved]
+        store.position[moved] = positions[matched]
+        store.last_seen[moved] = timestamp
+        store.last_frame[moved] = frame_number
+
+        new = ~matched
+        if new.any():
+            created = store.create(int(new.sum()))
+            store.position[created] = positions[new]
+            store.prev_position[created] = positions[new]
+            store.velocity[created] = self.belt_velocity
+            store.last_seen[created] = timestamp
+            store.last_frame[created] = frame_number
+            slots[new] = created
+
+        # Every track is in slots once at most, so the votes can be added directly
+        store.votes[slots, nut_classes] += confidences
+        store.nut_class[slots] = store.votes[slots].argmax(axis=1)
+        if len(slots):
+            self.seen_in_frame.append((frame_number, slots.copy()))
+        return slots
+
+    def expire(self, frame_number):
+        # Forget the nuts that haven't been seen for max_missed_frames frames,
+        # frame_number as given to update
+        # Only the frames that got too old are looked at, not every track
+        store = self.store
+        while self.seen_in_frame and frame_number - self.seen_in_frame[0][0] > self.max_missed_frames:
+            seen_frame, slots = self.seen_in_frame.popleft()
+            # Tracks seen again since then are in a later frame's slots, a freed
+            # slot reused by a new track has that track's last frame
+            stale = slots[store.alive[slots] & (store.last_frame[slots] == seen_frame)]
+            if len(stale):
+                store.release(stale)
+
+    def ids(self, slots):
+        return self.store.ids[slots]
+
+    def _update_velocities(self, slots, positions, elapsed):
+        # Moving average of each track's measured velocity, and of the belt's
+        # (median over the tracks, so a few bad matches don't move it)
+        seen_before = elapsed > 0
+        slots, positions, elapsed = slots[seen_before], positions[seen_before], elapsed[seen_before]
+        if not len(slots):
+            return
+        measured = (positions - self.store.position[slots]) / elapsed[:, None]
+        self.store.velocity[slots] += self.velocity_smoothing * (measured - self.store.velocity[slots])
+        if not self.belt_velocity_known:
+            self.belt_velocity += self.velocity_smoothing * (np.median(measured, axis=0) - self.belt_velocity)
+
+    def _candidates(self, positions, predicted):
+        # (detection, track slot) pairs of tracks in the 3x3 cells around each detection
+        # Cells are hashed into a table, so a collision only adds a few extra
+        # candidates that the distance test removes
+        store = self.store
+        live = np.flatnonzero(store.alive)
+        if not len(live) or not len(positions):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        track_keys = self._hash(np.floor(predicted[live] / self.max_distance).astype(np.int64))
+        order = np.argsort(track_keys, kind="stable")
+        sorted_tracks = live[order]
+        bucket_sizes = np.bincount(track_keys, minlength=_hash_table_size)
+        bucket_starts = np.cumsum(bucket_sizes) - bucket_sizes
+
+        cells = np.floor(positions / self.max_distance).astype(np.int64)
+        offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+        neighbour_keys = self._hash(cells[:, None, :] + offsets[None, :, :]).ravel()
+        sizes = bucket_sizes[neighbour_keys]
+        total = sizes.sum()
+        pair_detections = np.repeat(np.arange(len(positions)).repeat(len(offsets)), sizes)
+        within_bucket = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        pair_tracks = sorted_tracks[np.repeat(bucket_starts[neighbour_keys], sizes) + within_bucket]
+        return pair_detections, pair_tracks
+
+    @staticmethod
+    def _hash(cells):
+        return ((cells[..., 0] * 73856093) ^ (cells[..., 1] * 19349663)) & (_hash_table_size - 1)
+
+
+if __name__ == "__main__":
+    # Checks the incremental ageing against scanning every track: random nuts
+    # come and go for 600 frames, after each expire the live tracks have to be
+    # exactly the ones a full scan of last_frame would keep
+    rng = np.random.default_rng(1)
+    tracker = Tracker(30, 10, capacity=16)
+    tracker.set_belt_velocity((0, 300))
+    nuts = rng.uniform(0, 640, (40, 2)).astype(np.float32)
+    for frame_number in range(1, 601):
+        nuts[:, 1] = (nuts[:, 1] + 10) % 480
+        visible = rng.random(len(nuts)) < 0.3
+        tracker.update(np.zeros(visible.sum(), dtype=np.int32), nuts[visible], frame_number / 30, frame_number)
+        store = tracker.store
+        kept_by_scan = store.alive & (frame_number - store.last_frame <= tracker.max_missed_frames)
+        tracker.expire(frame_number)
+        assert np.array_equal(store.alive, kept_by_scan), frame_number
+        assert store.free_count + store.alive.sum() == store.capacity()
+
+    # A nut moving with the belt keeps its track (and id) while it's missed for
+    # up to max_missed_frames frames, and gets a new one after
+    tracker = Tracker(30, 3)
+    tracker.set_belt_velocity((0, 300))
+    first = tracker.ids(tracker.update([0], [(100, 0)], 0.0, 1))[0]
+    for frame_number in range(2, 5):
+        tracker.expire(frame_number)
+    assert tracker.ids(tracker.update([1], [(100, 40)], 4 / 30, 5))[0] == first
+    for frame_number in range(6, 10):
+        tracker.expire(frame_number)
+    assert tracker.ids(tracker.update([1], [(100, 90)], 9 / 30, 10))[0] != first
+    print("OK")
@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+
+from tracker import Tracker
+
+# Per frame tracking time with 5, 50 and 500 nuts on the belt
+# The nuts lie on a jittered grid 40 px apart and move down the belt a few
+# pixels per frame, some detections are missed now and then like with the
+# real model. The old linear scan (first match in the track list) is timed
+# for comparison. "tracks" is how many different tracks were handed out,
+# ideally the same as the number of nuts.
+#   python tracker_benchmark.py
+
+nut_classes = ["m6", "m8", "m10", "m12"]
+max_tracking_distance = 50
+frames = 100
+
+
+def simulated_frames(count, step=6, ramp=0, flips=0.0, seed=0):
+    # step is how far the belt moves per frame, reached after ramp frames from standstill
+    # flips is the fraction of detections the model gives the wrong class
+    rng = np.random.default_rng(seed)
+    columns = int(np.ceil(np.sqrt(count)))
+    grid = np.stack(np.meshgrid(np.arange(columns), np.arange(columns)), axis=-1).reshape(-1, 2)[:count]
+    positions = grid * 40.0 + rng.uniform(-8, 8, (count, 2))
+    classes = rng.integers(0, len(nut_classes), count)
+    for frame in range(frames):
+        positions[:, 1] += step * min(1.0, (frame + 1) / (ramp + 1))
+        jitter = positions + rng.normal(0, 1.5, positions.shape)
+        seen = rng.random(count) > 0.05
+        flipped = np.where(rng.random(count) < flips, (classes + rng.integers(1, len(nut_classes), count)) % len(nut_classes),
+                           classes)
+        yield flipped[seen], jitter[seen]
+
+
+class LinearScanTracker:
+    # The tracker before, match_or_create for every detection
+    def __init__(self, max_distance, max_missed_frames):
+        self.max_distance = max_distance
+        self.max_missed_frames = max_missed_frames
+        self.tracks = []
+
+    def ids(self, matched):
+        return [id(track) for track in matched]
+
+    def update(self, labels, positions, timestamp, frame_index):
+        matched = []
+        for label, position in zip(labels, positions):
+            for track in self.tracks:
+                if track["type"] == label and np.sqrt((track["pos"][0] - position[0])**2 +
+                                                      (track["pos"][1] - position[1])**2) < self.max_distance:
+                    track["pos"], track["seen"] = position, frame_index
+                    break
+            else:
+                track = {"type": label, "pos": position, "seen": frame_index}
+                self.tracks.append(track)
+            matched.append(track)
+        return matched
+
+    def expire(self, frame_index):
+        self.tracks[:] = [track for track in self.tracks if frame_index - track["seen"] <= self.max_missed_frames]
+
+
+def measure(tracker_class, count, step=6, ramp=0, belt_velocity=None, flips=0.0):
+    tracker = tracker_class(max_tracking_distance, 10)
+    if belt_velocity is not None:
+        tracker.set_belt_velocity(belt_velocity)
+    elapsed = 0.0
+    tracks = set()
+    for frame_index, (labels, positions) in enumerate(simulated_frames(count, step, ramp, flips)):
+        timestamp = frame_index / 30.0
+        start = time.perf_counter()
+        matched = tracker.update(labels, positions, timestamp, frame_index)
+        tracker.expire(frame_index)
+        elapsed += time.perf_counter() - start
+        tracks.update(tracker.ids(matched))
+    return elapsed / frames * 1000, len(tracks)
+
+
+if __name__ == "__main__":
+    print(f"{'nuts':>6}{'linear scan ms':>16}{'tracks':>8}{'tracker ms':>12}{'tracks':>8}")
+    for count in (5, 50, 500):
+        linear_ms, linear_tracks = measure(LinearScanTracker, count)
+        tracker_ms, tracker_tracks = measure(Tracker, count)
+        print(f"{count:>6}{linear_ms:>16.3f}{linear_tracks:>8}{tracker_ms:>12.3f}{tracker_tracks:>8}")
+
+    # Faster belts with 50 nuts: the tracker predicts where each nut should be,
+    # from the commanded belt speed or its own estimate. For the estimate the
+    # belt speeds up from standstill over 30 frames, on a grid of nuts a speed
+    # it never went through can't be found (any step of 40 px looks the same)
+    print()
+    print(f"{'px/frame':>9}{'linear tracks':>15}{'estimated tracks':>18}{'commanded tracks':>18}")
+    for step in (6, 30, 60, 120):
+        _, linear_tracks = measure(LinearScanTracker, 50, step, 30)
+        _, estimated_tracks = measure(Tracker, 50, step, 30)
+        _, commanded_tracks = measure(Tracker, 50, step, 0, (0, step * 30.0))
+        print(f"{step:>9}{linear_tracks:>15}{estimated_tracks:>18}{commanded_tracks:>18}")
+
+    # The model giving some detections the wrong class (like M10 and M12), 50 nuts
+    print()
+    print(f"{'flips':>9}{'linear tracks':>15}{'tracker tracks':>16}")
+    for flips in (0.0, 0.05, 0.2):
+        _, linear_tracks = measure(LinearScanTracker, 50, flips=flips)
+        _, tracker_tracks = measure(Tracker, 50, flips=flips)
+        print(f"{flips:>9.0%}{linear_tracks:>15}{tracker_tracks:>16}")
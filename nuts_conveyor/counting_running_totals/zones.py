@@ -0,0 +1,163 @@
+import numpy as np
+
+# Counting zones: lines and polygons on the belt
+# A zone with two points is a line, nuts are counted when they cross it going
+# the belt's way: from the left to the right side of the line looking from its
+# first point to its second (in image coordinates, so a line drawn left to
+# right counts nuts moving down). A zone with more points is a polygon, nuts
+# are counted when they enter it.
+#
+# Every frame the movement of each matched track (previous to current
+# position) is tested against all zones at once. A track is counted once per
+# zone. Crossings against the belt, e.g. a nut rolling back or the belt
+# reversed, are reported as direction -1 but don't count, so a nut going back
+# and forth over a line is still one nut. They are kept apart in
+# reverse_counts, every backward crossing (or nut leaving a polygon) once, to
+# show how often that happens. With the belt running backwards
+# (set_direction(-1)) the lines count the other way.
+
+
+def _cross(u, v):
+    return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+
+class ZoneCounter:
+    def __init__(self, zones, class_count=4, direction=1):
+        # zones is a list of (name, points), points are (x, y) in frame pixels
+        self.names = [name for name, _ in zones]
+        self.points = [np.array(points, dtype=np.float32) for _, points in zones]
+        self.direction = direction
+
+        self.line_zones = np.array([z for z, p in enumerate(self.points) if len(p) == 2], dtype=np.intp)
+        self.line_starts = np.array([self.points[z][0] for z in self.line_zones], dtype=np.float32).reshape(-1, 2)
+        self.line_ends = np.array([self.points[z][1] for z in self.line_zones], dtype=np.float32).reshape(-1, 2)
+
+        # The edges of all polygons in one array, edge_offsets[i] is where polygon i starts
+        self.polygon_zones = np.array([z for z, p in enumerate(self.points) if len(p) > 2], dtype=np.intp)
+        polygons = [self.points[z] for z in self.polygon_zones]
+        self.edge_starts = np.concatenate(polygons).reshape(-1, 2) if polygons else np.zeros((0, 2), np.float32)
+        self.edge_ends = (np.concatenate([np.roll(p, -1, axis=0) for p in polygons]).reshape(-1, 2)
+                          if polygons else np.zeros((0, 2), np.float32))
+        self.edge_offsets = np.cumsum([0] + [len(p) for p in polygons[:-1]]).astype(np.intp)
+
+        # counts[zone, class] nuts counted, reverse_counts[zone, class] backward
+        # crossings, counted_id[slot, zone] the id of the track last counted in
+        # that slot (slots are reused, ids never are)
+        self.counts = np.zeros((len(zones), class_count), dtype=np.int64)
+        self.reverse_counts = np.zeros((len(zones), class_count), dtype=np.int64)
+        self.counted_id = np.zeros((0, len(zones)), dtype=np.int64)
+
+    def set_direction(self, direction):
+        # 1 when the belt runs forward, -1 when it runs backwards
+        self.direction = direction
+
+    def add_classes(self, class_count):
+        # More count columns, e.g. for a model with classes the counters didn't have yet
+        for name in ("counts", "reverse_counts"):
+            counts = np.zeros((len(self.names), class_count), dtype=np.int64)
+            counts[:, :getattr(self, name).shape[1]] = getattr(self, name)
+            setattr(self, name, counts)
+
+    def reset_counts(self):
+        self.counts[:] = 0
+        self.reverse_counts[:] = 0
+
+    def update(self, store, slots):
+        # Tests the tracks in slots (just updated by the tracker) against every zone
+        # Returns the crossings of this frame as arrays (index into slots, zone,
+        # direction), direction 1 is with the belt or into a polygon
+        if len(self.counted_id) < store.capacity():
+            counted_id = np.zeros((store.capacity(), len(self.names)), dtype=np.int64)
+            counted_id[:len(self.counted_id)] = self.counted_id
+            self.counted_id = counted_id
+
+        crossing = self.crossings(store.prev_position[slots], store.position[slots])
+        detection, zone = np.nonzero(crossing)
+        direction = crossing[detection, zone]
+
+        # Count the tracks that crossed the belt's way and weren't counted in the zone yet
+        ids = store.ids[slots[detection]]
+        new = (direction > 0) & (self.counted_id[slots[detection], zone] != ids)
+        self.counted_id[slots[detection[new]], zone[new]] = ids[new]
+        np.add.at(self.counts, (zone[new], store.nut_class[slots[detection[new]]]), 1)
+        backward = direction < 0
+        np.add.at(self.reverse_counts, (zone[backward], store.nut_class[slots[detection[backward]]]), 1)
+        return detection, zone, direction
+
+    def crossings(self, start, end):
+        # (tracks, zones) array: 1 for a track crossing a line the belt's way or
+        # entering a polygon, -1 for the other way or leaving, 0 otherwise
+        crossing = np.zeros((len(start), len(self.names)), dtype=np.int8)
+        if not len(start):
+            return crossing
+
+        if len(self.line_zones):
+            line = self.line_ends - self.line_starts
+            side_before = _cross(line[None], start[:, None] - self.line_starts[None])
+            side_after = _cross(line[None], end[:, None] - self.line_starts[None])
+            # The line's ends on different sides of the movement, i.e. it crossed
+            # the line itself and not where the line would continue
+            movement = (end - start)[:, None]
+            within = (_cross(movement, self.line_starts[None] - start[:, None]) *
+                      _cross(movement, self.line_ends[None] - start[:, None])) <= 0
+            forward = within & (side_before < 0) & (side_after >= 0)
+            backward = within & (side_before >= 0) & (side_after < 0)
+            crossing[:, self.line_zones] = (forward.astype(np.int8) - backward) * self.direction
+
+        if len(self.polygon_zones):
+            crossing[:, self.polygon_zones] = (self.inside(end).astype(np.int8) - self.inside(start))
+        return crossing
+
+    def inside(self, points):
+        # (points, polygons) array, True when a point is inside the polygon
+        # A ray from the point to the right crosses an odd number of edges
+        x, y = points[:, 0:1], points[:, 1:2]
+        ya, yb = self.edge_starts[None, :, 1], self.edge_ends[None, :, 1]
+        xa, xb = self.edge_starts[None, :, 0], self.edge_ends[None, :, 0]
+        spans = (ya > y) != (yb > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hits = spans & (x < xa + (y - ya) * (xb - xa) / (yb - ya))
+        return np.add.reduceat(hits, self.edge_offsets, axis=1) % 2 == 1
+
+
+if __name__ == "__main__":
+    # Checks the crossing tests and the counting on made up tracks
+    from tracker import TrackStore
+
+    line = ("Line", [(0, 100), (200, 100)])
+    # A concave polygon, a U open at the top: (45, 25) is in the notch, outside
+    u_shape = ("U", [(300, 0), (330, 0), (330, 50), (360, 50), (360, 0), (390, 0), (390, 100), (300, 100)])
+    counter = ZoneCounter([line, u_shape], class_count=2)
+
+    start = np.array([(50, 90), (50, 110), (250, 90), (345, 25), (310, 25), (310, 25)], dtype=np.float32)
+    end = np.array([(50, 110), (50, 90), (250, 110), (345, 75), (345, 25), (310, 60)], dtype=np.float32)
+    # Down over the line, up over it, past its end, notch into the U, out of the U into the
+    # notch and within the U
+    assert counter.crossings(start, end).tolist() == [[1, 0], [-1, 0], [0, 0], [0, 1], [0, -1], [0, 0]]
+    points = np.array([(345, 25), (315, 25), (345, 75), (400, 50)], dtype=np.float32)
+    assert counter.inside(points).ravel().tolist() == [False, True, True, False]
+    counter.set_direction(-1)
+    assert counter.crossings(start[:3], end[:3])[:, 0].tolist() == [-1, 1, 0]
+    counter.set_direction(1)
+
+    # A nut going down over the line, back up and down again is one nut and one
+    # backward crossing. A nut of the other class only going up isn't counted
+    store = TrackStore(capacity=4, class_count=2)
+    slots = store.create(2)
+    store.nut_class[slots] = (0, 1)
+    store.position[slots] = [(50, 90), (100, 120)]
+    for ys in ((110, 120), (95, 80), (105, 80)):
+        store.prev_position[slots] = store.position[slots]
+        store.position[slots] = [(50, ys[0]), (100, ys[1])]
+        counter.update(store, slots)
+    assert counter.counts[0].tolist() == [1, 0] and counter.reverse_counts[0].tolist() == [1, 1]
+    # A new track in a reused slot counts again
+    store.release(slots[:1])
+    slot = store.create(1)
+    store.nut_class[slot] = 0
+    store.prev_position[slot], store.position[slot] = (60, 90), (60, 110)
+    counter.update(store, slot)
+    assert counter.counts[0].tolist() == [2, 0]
+    counter.reset_counts()
+    assert not counter.counts.any() and not counter.reverse_counts.any()
+    print("OK")
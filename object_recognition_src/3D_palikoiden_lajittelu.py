@@ -1,6 +1,9 @@
 import numpy as np                                                      # Numpy-kirjaston tuonti numeerisiin operaatioihin.
 import cv2                                                              # OpenCV-kirjaston tuonti kuvankäsittelyyn.
-import tensorflow as tf                                                 # TensorFlow-kirjaston tuonti ML-malleihin.
+import os                                                               # Os-kirjaston tuonti polkuja varten.
+import sys                                                              # Sys-kirjaston tuonti hakupolkua varten.
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "nuts_conveyor", "counting_running_totals"))
+from tflite_backend import Interpreter                                  # TFLite-tulkki laskentaohjelman tflite_backend-moduulista.
 import pydobot, serial                                                  # Pydobot- ja serial-kirjastojen tuonti Dobotin ohjaukseen.
 
 # Vakiot
@@ -68,7 +71,7 @@ def initialize_camera(port=CAM_PORT):                                   # Kamera
     return cv2.VideoCapture(port, cv2.CAP_DSHOW)                        # Palauta kameran kaappausobjekti.
 
 def load_tflite_model(model_path=MODEL_PATH):                           # TensorFlow Lite -mallin latausfunktio.
-    interpreter = tf.lite.Interpreter(model_path=model_path)            # Lataa TFLite-malli.
+    interpreter = Interpreter(model_path=model_path)                    # Lataa TFLite-malli.
     interpreter.allocate_tensors()                                      # Allokoi tensorit tulkkille.
     return interpreter                                                  # Palauta mallin tulkki.
 
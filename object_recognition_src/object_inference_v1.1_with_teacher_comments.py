@@ -1,6 +1,9 @@
 import numpy as np                                                      # Import the NumPy library for numerical operations.
 import cv2                                                              # Import the OpenCV library for image processing.
-import tensorflow as tf                                                 # Import the TensorFlow library for ML models.
+import os                                                               # Import os to build the path below.
+import sys                                                              # Import sys to extend the module search path.
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "nuts_conveyor", "counting_running_totals"))
+from tflite_backend import Interpreter                                  # The TFLite interpreter, picked by tflite_backend of the counting program.
 import time
 
 
@@ -15,7 +18,7 @@ def initialize_camera(port=CAM_PORT):                                   # Functi
 
 def load_tflite_model(model_path=MODEL_PATH):                           # Function to load a TensorFlow Lite model.
     # Load the TensorFlow Lite model 
-    interpreter = tf.lite.Interpreter(model_path=model_path)            # Load TFLite model.
+    interpreter = Interpreter(model_path=model_path)                    # Load TFLite model.
     interpreter.allocate_tensors()                                      # Allocate tensors for the interpreter.
     return interpreter                                                  # Return the model interpreter.
 